@@ -1,80 +1,211 @@
 import aiohttp
 import asyncio
-from bs4 import BeautifulSoup
 import random
 import re
 from tqdm.asyncio import tqdm_asyncio
-from urllib.parse import urljoin
-import phonenumbers
+from urllib.parse import urlencode, urljoin, urlsplit
 import requests
 from collections import Counter
-import json
 import time
+from contextvars import ContextVar
+from cache import ResponseCache, normalizar_url
+from canonical import agrupar_queries, canonicalizar_query
+from cep import VIACEP_URL
+from connection import ManagedSession
+from parsing import BACKEND_PADRAO, ParserPool, extrair_texto_e_links
+from fetch_policy import MAX_BYTES_RESPOSTA, TIPOS_PERMITIDOS, FetchPolicy
+from metrics import Cronometro, categorizar, medir, registrar_bytes, registrar_erro, registrar_tempos
+from request_policy import (ESPERA_BASE, ESPERA_MAXIMA, FRACOES_ETAPA, HEDGE_APOS, ORCAMENTO_QUERY, PRAZO, TENTATIVAS,
+                            Prazo, RequestPolicy, prazo_da_etapa, reunir_ate_o_prazo)
+from tiered_fetch import HOSTS_JS, TieredFetcher
+from rate_control import TAXAS_HOST, BloqueioDetectado, RateController, detectar_bloqueio
+from models import FONTE_KNOWLEDGE_GRAPH, ContactInfo, KnowledgeGraph, QueryResult
+from extractor import extrair_contatos, normalizar_social_media
+from phones import normalizar_telefone, validar_lote
+from serp import parse_serp
+from sinks import JsonlSink
+from singleflight import SingleFlight
 
 TIMEOUT = 20
-# Função para capturar informações do Knowledge Graph
-async def extract_knowledge_graph(soup):
-    knowledge_data = {}
-
-    # Capturando o título (nome do lugar)
-    title_elem = soup.find('div', {'data-attrid': 'title'})
-    if title_elem:
-        knowledge_data['title'] = title_elem.get_text()
-
-    # Capturando a nota
-    rating_elem = soup.find('span', {'class': 'Aq14fc'})
-    if rating_elem:
-        knowledge_data['rating'] = rating_elem.get_text()
-
-    # Capturando o número de avaliações
-    review_count_elem = soup.find('span', {'class': 'hqzQac'})
-    if review_count_elem:
-        knowledge_data['review_count'] = review_count_elem.get_text()
-
-    # Capturando a faixa de preço
-    price_range_elem = soup.find('span', {'class': 'rRfnje'})
-    if price_range_elem:
-        knowledge_data['price_range'] = price_range_elem.get_text()
-
-    # Capturando a descrição
-    description_elem = soup.find('div', {'data-attrid': 'kc:/location/location:short_description'})
-    if description_elem:
-        knowledge_data['description'] = description_elem.get_text()
-
-    # Capturando o endereço
-    address_elem = soup.find('div', {'data-attrid': 'kc:/location/location:address'})
-    if address_elem:
-        knowledge_data['address'] = address_elem.get_text()
-
-    # Capturando o telefone usando um seletor mais preciso
-    phone_elem = soup.find('span', string=re.compile(r'^\(?\+?[0-9]{1,4}\)?[\s.-]?[0-9]{1,4}[\s.-]?[0-9]{1,4}[\s.-]?[0-9]{1,9}$'))
-    if phone_elem:
-        knowledge_data['phone'] = phone_elem.get_text()
-
-    # Capturando o horário de funcionamento
-    hours_elem = soup.find('div', {'data-attrid': 'kc:/location/location:hours'})
-    if hours_elem:
-        knowledge_data['hours'] = hours_elem.get_text()
-
-    return knowledge_data
+
+# Endereço da busca; pode ser trocado por um servidor local (ver benchmark.py)
+GOOGLE_SEARCH_URL = "https://www.google.com/search"
+
+# Número máximo de queries processadas ao mesmo tempo (cada uma abre várias requisições)
+MAX_QUERIES_SIMULTANEAS = 20
+
+# Caminhos tentados na varredura profunda quando a página principal não tem contatos
+DEEP_SCAN_PATHS = ['about', 'contact', 'profile', 'info']
+# Trechos de URL que indicam uma página de contato, usados para descobrir links na página principal
+PALAVRAS_LINK_CONTATO = ('contato', 'contact', 'fale-conosco', 'faleconosco', 'sobre', 'about', 'quem-somos', 'atendimento')
+MAX_LINKS_CONTATO = 4
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+]
+
+# Cache de respostas em disco (desligado até ser configurado com configurar_cache)
+RESPONSE_CACHE = None
+
+# Função para configurar o cache de respostas HTTP usado por todas as buscas
+def configurar_cache(diretorio='.cache/http', ttl=24 * 60 * 60, max_bytes=512 * 1024 * 1024, modo='normal'):
+    global RESPONSE_CACHE
+    RESPONSE_CACHE = ResponseCache(diretorio, ttl=ttl, max_bytes=max_bytes, modo=modo)
+    return RESPONSE_CACHE
+
+# Política de leitura das respostas: tipos de conteúdo aceitos e limite de bytes por corpo
+FETCH_POLICY = FetchPolicy()
+
+# Função para configurar o limite de bytes e os tipos de conteúdo lidos de cada resposta
+def configurar_fetch(max_bytes=MAX_BYTES_RESPOSTA, tipos_permitidos=TIPOS_PERMITIDOS):
+    global FETCH_POLICY
+    FETCH_POLICY = FetchPolicy(max_bytes=max_bytes, tipos_permitidos=tipos_permitidos)
+    return FETCH_POLICY
+
+# Retentativas e hedge das requisições, e orçamento de tempo de cada query
+REQUEST_POLICY = RequestPolicy()
+ORCAMENTO = ORCAMENTO_QUERY
+
+# Função para configurar as retentativas, o hedge de requisições lentas e o orçamento por query
+def configurar_retentativas(tentativas=TENTATIVAS, espera_base=ESPERA_BASE, espera_maxima=ESPERA_MAXIMA,
+                            hedge_apos=HEDGE_APOS, orcamento=ORCAMENTO_QUERY):
+    global REQUEST_POLICY, ORCAMENTO
+    REQUEST_POLICY = RequestPolicy(tentativas, espera_base, espera_maxima, hedge_apos)
+    ORCAMENTO = orcamento
+    return REQUEST_POLICY
+
+# Busca em camadas: páginas que dependem de JavaScript sobem para um navegador do pool
+# (desligada até ser configurada com configurar_escalonamento)
+ESCALONADOR = None
+
+# Função para ligar a busca em camadas com um DriverPool (None desliga)
+def configurar_escalonamento(pool=None, hosts_js=HOSTS_JS):
+    global ESCALONADOR
+    if ESCALONADOR is not None:
+        ESCALONADOR.close()
+    ESCALONADOR = TieredFetcher(pool, hosts_js=hosts_js) if pool is not None else None
+    return ESCALONADOR
+
+# Controle de taxa por host, ajustado pelas respostas de bloqueio (429, captcha, consentimento)
+CONTROLE_TAXA = RateController()
+
+# Função para configurar as taxas iniciais e máximas por host (host: (inicial, máxima))
+def configurar_controle_taxa(taxas_host=TAXAS_HOST):
+    global CONTROLE_TAXA
+    CONTROLE_TAXA = RateController(taxas_host)
+    return CONTROLE_TAXA
+
+# Queries em andamento ao mesmo tempo: até MAX_QUERIES_SIMULTANEAS, mas não mais do que
+# o host da busca consegue atender dentro do prazo da etapa de busca
+def janela_queries():
+    capacidade = CONTROLE_TAXA.capacidade(GOOGLE_SEARCH_URL, ORCAMENTO * FRACOES_ETAPA['busca'])
+    if capacidade is None:
+        return MAX_QUERIES_SIMULTANEAS
+    return max(1, min(MAX_QUERIES_SIMULTANEAS, capacidade))
+
+# Deduplicação de URLs do lote em andamento (definida por iterar_queries)
+DEDUPLICADOR = ContextVar('deduplicador', default=None)
+# Deduplicação de queries equivalentes do lote em andamento (definida por iterar_queries)
+CONSULTAS = ContextVar('consultas', default=None)
+
+# Pool onde o parsing do HTML e as extrações rodam, fora do event loop
+PARSER_POOL = ParserPool()
+
+# Função para configurar o pool de parsing (modo 'process', 'thread' ou 'inline' e o backend)
+def configurar_parser(modo='process', workers=None, backend=BACKEND_PADRAO):
+    global PARSER_POOL
+    PARSER_POOL.close()
+    PARSER_POOL = ParserPool(modo, workers=workers, backend=backend)
+    return PARSER_POOL
+
+def gerar_headers():
+    return {"User-Agent": random.choice(USER_AGENTS)}
+
+# Função para baixar uma página consultando o cache antes da rede.
+# O corpo é lido conforme FETCH_POLICY: conteúdos que não são HTML voltam como texto
+# vazio e páginas muito grandes são cortadas no limite de bytes.
+# 'etapa' identifica a requisição nas métricas (busca, site, subpagina, posts) e define
+# seu prazo dentro do orçamento da query. Erros transitórios são repetidos (REQUEST_POLICY);
+# bloqueios (CONTROLE_TAXA) levantam BloqueioDetectado e não vão para o cache.
+async def fetch_html(url, session, headers, etapa='pagina'):
+    if RESPONSE_CACHE is not None:
+        cached = RESPONSE_CACHE.get(url, headers)
+        if cached is not None and detectar_bloqueio(*cached, etapa) is None:
+            return cached
+
+    status, text = await REQUEST_POLICY.executar(
+        lambda timeout: baixar(url, session, headers, etapa, timeout), etapa, prazo_da_etapa(etapa))
+
+    # Erros de servidor e limites de taxa (429) são transitórios e não vão para o cache
+    if RESPONSE_CACHE is not None and status < 500 and status not in REQUEST_POLICY.status_transitorios:
+        RESPONSE_CACHE.set(url, status, text, headers)
+    return status, text
+
+# Função para baixar a página de um site: por HTTP e, com a busca em camadas ligada,
+# pelo navegador quando a página depende de JavaScript
+async def buscar_pagina(url, session, headers, etapa='site'):
+    if ESCALONADOR is None:
+        return await fetch_html(url, session, headers, etapa)
+    return await ESCALONADOR.buscar(url, lambda: fetch_html(url, session, headers, etapa),
+                                    lambda url: renderizar_pagina(ESCALONADOR, url, etapa))
+
+# Função para renderizar uma página no navegador com as mesmas regras do HTTP: cache
+# (no modo 'replay' nada é renderizado), controle de taxa do host, limite de bytes e prazo da etapa
+async def renderizar_pagina(escalonador, url, etapa='site'):
+    if RESPONSE_CACHE is not None:
+        cached = RESPONSE_CACHE.get(url, variante='navegador')
+        if cached is not None:
+            return cached[1]
+
+    prazo = prazo_da_etapa(etapa)
+    timeout = prazo.restante() if prazo is not None else None
+    espera = await CONTROLE_TAXA.aguardar(url, prazo=timeout)
+    try:
+        html = await escalonador.renderizar(url, timeout - espera if timeout is not None else None)
+    except BaseException:
+        CONTROLE_TAXA.cancelar(url)
+        raise
+    CONTROLE_TAXA.registrar(url, None)
+
+    html = FETCH_POLICY.limitar(html)
+    if RESPONSE_CACHE is not None:
+        RESPONSE_CACHE.set(url, 200, html, variante='navegador')
+    return html
+
+# Uma tentativa de download, limitada pelo que resta do prazo da etapa (a espera pela vez
+# no controle de taxa conta no prazo; se não couber, a query é adiada com BloqueioDetectado)
+async def baixar(url, session, headers, etapa, timeout=None):
+    espera = await CONTROLE_TAXA.aguardar(url, prazo=timeout)
+    timeout = min(TIMEOUT, timeout - espera) if timeout is not None else TIMEOUT
+    try:
+        with medir(etapa):
+            async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                text, tamanho = await FETCH_POLICY.ler(response)
+                status = response.status
+    except BaseException:
+        CONTROLE_TAXA.cancelar(url)
+        raise
+    registrar_bytes(etapa, tamanho)
+    if status >= 400:
+        registrar_erro(etapa, f'http_{status // 100}xx')
+    CONTROLE_TAXA.registrar(url, detectar_bloqueio(status, text, etapa))
+    return status, text
 
 # Função para validar e formatar números de telefone
+# (com pré-filtro e cache compartilhado por todo o lote, ver phones.py)
 def validar_e_formatar_telefone(numero, regioes='BR'):
-    try:
-        numero_parseado = phonenumbers.parse(numero, regioes)
-        if phonenumbers.is_valid_number(numero_parseado):
-            formato_internacional = phonenumbers.format_number(numero_parseado, phonenumbers.PhoneNumberFormat.E164)
-            formato_nacional = phonenumbers.format_number(numero_parseado, phonenumbers.PhoneNumberFormat.NATIONAL)
-            return formato_internacional, formato_nacional
-        else:
-            return None, "Número inválido"
-    except phonenumbers.NumberParseException as e:
-        return None, str(e)
-
-# Função para consultar e validar CEP
+    return normalizar_telefone(numero, regioes)
+
+# Função para consultar e validar CEP (síncrona, para uso fora do event loop;
+# no pipeline assíncrono use cep.CepResolver, que tem cache e agrupa requisições)
 def consultar_cep(cep):
-    url = f'https://viacep.com.br/ws/{cep}/json/'
-    response = requests.get(url)
+    url = f'{VIACEP_URL}/{cep}/json/'
+    try:
+        response = requests.get(url, timeout=TIMEOUT)
+    except requests.RequestException:
+        return False, "Erro ao consultar CEP"
     if response.status_code == 200:
         dados = response.json()
         if 'erro' in dados:
@@ -83,235 +214,226 @@ def consultar_cep(cep):
     else:
         return False, "Erro ao consultar CEP"
 
-# Função assíncrona para realizar a busca no Google
+# Função para extrair os resultados de uma página de busca (executada no pool de parsing).
+# Só as regiões do Knowledge Graph e dos resultados viram árvore, ver serp.py.
+def parse_search_results(text, backend=BACKEND_PADRAO):
+    return parse_serp(text, backend)
+
+# A busca não chegou a uma página de resultados (erro de rede, prazo, resposta fora do cache
+# no modo replay): diferente de uma busca sem resultados, a query deve ser tentada de novo
+class FalhaBusca(Exception):
+    def __init__(self, query, motivo):
+        super().__init__(f'{query}: {motivo}')
+        self.query = query
+        self.motivo = motivo
+
+# Função assíncrona para realizar a busca no Google. Bloqueios (429, captcha, consentimento)
+# levantam BloqueioDetectado e as demais falhas FalhaBusca, para não serem confundidos
+# com uma busca sem resultados.
 async def google_search(query, session):
-    google_search_url = f"https://www.google.com/search?q={query}"
-    headers = {
-        "User-Agent": random.choice([
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-            "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        ])
-    }
+    google_search_url = f"{GOOGLE_SEARCH_URL}?{urlencode({'q': query})}"
+    headers = gerar_headers()
 
     try:
-        async with session.get(google_search_url, headers=headers, timeout=aiohttp.ClientTimeout(total=TIMEOUT)) as response:
-            text = await response.text()
-            soup = BeautifulSoup(text, "html.parser")
-
-            results = []
-
-            # Captura do Knowledge Graph
-            knowledge_graph_data = await extract_knowledge_graph(soup)
-            if knowledge_graph_data:
-                results.append({
-                    'title': knowledge_graph_data.get('title', 'No title'),
-                    'link': 'Info do Knowledge Graph',
-                    'knowledge_data': knowledge_graph_data
-                })
-            else:
-                pass
-
-            # Extrair links dos resultados normais de busca
-            for g in soup.find_all('div', class_='g'):
-                title = g.find('h3').text if g.find('h3') else "No title"
-                a_tag = g.find('a')
-                link = a_tag['href'] if a_tag and a_tag.has_attr('href') else None
-                snippet = g.find('span', class_='aCOpRe').text if g.find('span', class_='aCOpRe') else "No snippet"
-                results.append({'title': title, 'link': link, 'snippet': snippet})
-
-            return results
-    except asyncio.TimeoutError:
-        return []
+        status, text = await fetch_html(google_search_url, session, headers, etapa='busca')
+        with medir('busca_parsing'):
+            return await PARSER_POOL.run(parse_search_results, text)
+    except BloqueioDetectado:
+        raise
     except Exception as e:
-        return []
-
-def normalizar_social_media(url):
-    # Regex para redes sociais (apenas perfil principal)
-    patterns = {
-        'facebook': r'https://(?:www\.)?facebook\.com/([^/?\s\'"<>]+)(?:/.*)?',
-        'linkedin': r'https://(?:www\.)?linkedin\.com/(?:company/|in/)([^/?\s\'"<>]+)(?:/.*)?',
-        'instagram': r'https://(?:www\.)?instagram\.com/([^/?\s\'"<>]+)(?:/.*)?'
-    }
+        raise FalhaBusca(query, categorizar(e)) from e
+
+# Função para extrair e-mails e telefones de páginas com posts (executada no pool de parsing)
+def parse_posts_page(text, backend=BACKEND_PADRAO):
+    cronometro = Cronometro()
+    with cronometro.medir('html'):
+        page_text, links = extrair_texto_e_links(text, backend)
+    with cronometro.medir('extracao'):
+        contatos = extrair_contatos(page_text + '\n' + '\n'.join(links))
+    with cronometro.medir('telefones'):
+        phones = validar_lote(contatos['phones'])
 
-    for site, pattern in patterns.items():
-        match = re.search(pattern, url)
-        if match:
-            return f'https://{site}.com/{match.group(1)}'
-
-    return None
+    return {
+        'emails': contatos['emails'],
+        'phones': phones,
+        'tempos': cronometro.tempos
+    }
 
 async def buscar_info_em_posts(url, session):
-    headers = {
-        "User-Agent": random.choice([
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-            "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        ])
-    }
+    headers = gerar_headers()
 
     try:
-        async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=TIMEOUT)) as response:
-            text = await response.text()
-            soup = BeautifulSoup(text, "html.parser")
-
-            # Expressões regulares para encontrar e-mails e números de telefone
-            email_regex = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-            phone_regex = r'\(?\+?55\)?[\s.-]?\(?[0-9]{2}\)?[\s.-]?[0-9]{4,5}[\s.-]?[0-9]{4}'
-
-            # Encontrar e-mails e números de telefone no texto geral
-            emails = re.findall(email_regex, soup.get_text())
-            phones = re.findall(phone_regex, soup.get_text())
-
-            # Encontrar e-mails e números de telefone em elementos específicos de posts
-            post_elements = soup.find_all(['div', 'p', 'span'], string=True)
-            for post in post_elements:
-                post_text = post.get_text()
-                emails.extend(re.findall(email_regex, post_text))
-                phones.extend(re.findall(phone_regex, post_text))
-
-            valid_emails = list(set(emails))
-            valid_phones = []
-            for phone in set(phones):
-                internacional, nacional = validar_e_formatar_telefone(phone)
-                if internacional:
-                    valid_phones.append(internacional)
-            valid_phones = list(set(valid_phones))
-
-            return {
-                'emails': valid_emails,
-                'phones': valid_phones
-            }
+        status, text = await fetch_html(url, session, headers, etapa='posts')
+        with medir('posts_parsing'):
+            page = await PARSER_POOL.run(parse_posts_page, text)
+        registrar_tempos(page.pop('tempos'))
+        return page
     except asyncio.TimeoutError:
         return {'error': 'Timeout'}
     except Exception as e:
         return {'error': str(e)}
 
+# Adiciona um perfil normalizado, mantendo apenas o primeiro de cada rede
+def adicionar_perfil(social_media_profiles, normalized_url):
+    if normalized_url:
+        key = normalized_url.split('/')[2]
+        if key not in social_media_profiles:
+            social_media_profiles[key] = normalized_url
+
+# Filtrar para garantir que apenas perfis principais sejam retornados
+def filtrar_perfis_principais(social_media_profiles):
+    valid_social_media_profiles = {}
+    for key, profile_url in social_media_profiles.items():
+        if 'photo.php' in profile_url or 'p/' in profile_url:
+            continue  # Ignorar links de fotos ou vídeos
+        valid_social_media_profiles[key] = profile_url
+    return list(set(valid_social_media_profiles.values()))
+
+# Seleciona os links da página que provavelmente levam a uma página de contato
+def encontrar_links_contato(links):
+    contact_links = []
+    for link in links:
+        link_lower = link.lower()
+        if link_lower.startswith(('mailto:', 'tel:', 'javascript:', '#')):
+            continue
+        if any(palavra in link_lower for palavra in PALAVRAS_LINK_CONTATO) and link not in contact_links:
+            contact_links.append(link)
+    return contact_links[:MAX_LINKS_CONTATO]
+
+# Função para extrair contatos de uma página (executada no pool de parsing)
+# Os tempos de cada etapa voltam em 'tempos' e são registrados nas métricas por quem chamou.
+def parse_contact_page(text, backend=BACKEND_PADRAO):
+    cronometro = Cronometro()
+    with cronometro.medir('html'):
+        page_text, links = extrair_texto_e_links(text, backend)
+    with cronometro.medir('extracao'):
+        contatos = extrair_contatos(page_text + '\n' + '\n'.join(links))
+    with cronometro.medir('telefones'):
+        phones = validar_lote(contatos['phones'])
+
+    return {
+        'emails': contatos['emails'],
+        'phones': phones,
+        'addresses': contatos['addresses'],
+        'social_media_profiles': contatos['social_media_profiles'],
+        'contact_links': encontrar_links_contato(links),
+        'tempos': cronometro.tempos
+    }
+
+# Monta a lista de subpáginas da varredura profunda: primeiro os links de contato
+# encontrados na página, depois os caminhos padrão. Só considera o mesmo site.
+def candidatos_deep_scan(url, contact_links):
+    host = urlsplit(url).hostname
+    candidatos = []
+    for caminho in list(contact_links) + DEEP_SCAN_PATHS:
+        new_url = urljoin(url, caminho).split('#')[0]
+        if urlsplit(new_url).hostname == host and new_url != url and new_url not in candidatos:
+            candidatos.append(new_url)
+    return candidatos
+
+async def buscar_subpagina(url, session, headers):
+    status, text = await buscar_pagina(url, session, headers, etapa='subpagina')
+    if status != 200:
+        return None
+    with medir('site_parsing'):
+        page = await PARSER_POOL.run(parse_contact_page, text)
+    registrar_tempos(page.pop('tempos'))
+    page['url'] = url
+    return page
+
+# Varredura profunda: busca todas as subpáginas ao mesmo tempo e cancela as
+# restantes assim que uma delas trouxer dados de contato
+async def deep_scan_contact_info(url, session, headers, contact_links):
+    tasks = [asyncio.create_task(buscar_subpagina(new_url, session, headers))
+             for new_url in candidatos_deep_scan(url, contact_links)]
+    try:
+        for future in asyncio.as_completed(tasks):
+            try:
+                sub_page = await future
+            except Exception as e:
+                continue
+            if sub_page and any(sub_page[key] for key in ('emails', 'phones', 'addresses', 'social_media_profiles')):
+                return sub_page
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
+
 async def scrape_contact_info(url, session, deep_scan=False):
     if not url:
         return {'error': 'No URL provided'}
 
-    headers = {
-        "User-Agent": random.choice([
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-            "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        ])
-    }
-
-    social_media_regex = r'(?:https?://(?:www\.)?(facebook|instagram|linkedin)\.com/[^?\s\'"<>]+)'
+    headers = gerar_headers()
 
     try:
+        # O próprio link pode ser um perfil de rede social
         social_media_profiles = {}
-        if re.search(social_media_regex, url):
-            normalized_url = normalizar_social_media(url)
-            if normalized_url:
-                key = normalized_url.split('/')[2]
-                if key not in social_media_profiles:
-                    social_media_profiles[key] = normalized_url
-
-        async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=TIMEOUT)) as response:
-            text = await response.text()
-            soup = BeautifulSoup(text, "html.parser")
-
-            email_regex = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-            phone_regex = r'\(?\+?[0-9]{1,4}\)?[\s.-]?[0-9]{1,4}[\s.-]?[0-9]{1,4}[\s.-]?[0-9]{1,9}'
-            address_regex = r'\d+\s[\w\s.-]+,\s?[A-Za-z\s]+,\s?[A-Za-z\s]+,\s?\d{5}(-\d{4})?'
-
-            # Encontrar emails e telefones no conteúdo das postagens
-            emails = re.findall(email_regex, soup.get_text())
-            phones = re.findall(phone_regex, soup.get_text())
-            addresses = re.findall(address_regex, soup.get_text())
-            profiles = re.findall(social_media_regex, soup.get_text())
-
-            # Procurar informações em postagens específicas (exemplo genérico, ajustar conforme a estrutura da página)
-            post_elements = soup.find_all('div', {'class': 'x11i5rnm'})  # Ajustar seletor conforme necessário
-            for post in post_elements:
-                post_text = post.get_text()
-                emails.extend(re.findall(email_regex, post_text))
-                phones.extend(re.findall(phone_regex, post_text))
-
-            for profile in profiles:
-                normalized_url = normalizar_social_media(f'https://{profile[0]}.com/{profile[1]}')
-                if normalized_url:
-                    key = normalized_url.split('/')[2]
-                    if key not in social_media_profiles:
-                        social_media_profiles[key] = normalized_url
-
-        # Filtrar para garantir que apenas perfis principais sejam retornados
-        valid_social_media_profiles = {}
-        for key, url in social_media_profiles.items():
-            if 'photo.php' in url or 'p/' in url:
-                continue  # Ignorar links de fotos ou vídeos
-            valid_social_media_profiles[key] = url
-
-        emails = list(set(emails))
-        valid_phones = []
-        for phone in set(phones):
-            internacional, nacional = validar_e_formatar_telefone(phone)
-            if internacional:
-                valid_phones.append(internacional)
-        valid_phones = list(set(valid_phones))
-
-        addresses = list(set(addresses))
-        social_media_profiles = list(set(valid_social_media_profiles.values()))
+        adicionar_perfil(social_media_profiles, normalizar_social_media(url))
 
-        contact_info = {
-            'emails': emails,
-            'phones': valid_phones,
-            'addresses': addresses,
-            'social_media_profiles': social_media_profiles
-        }
+        status, text = await buscar_pagina(url, session, headers, etapa='site')
+        with medir('site_parsing'):
+            page = await PARSER_POOL.run(parse_contact_page, text)
+        registrar_tempos(page.pop('tempos'))
 
-        if deep_scan and not any([emails, valid_phones, addresses, social_media_profiles]):
-            # Exemplo de possíveis caminhos para a varredura profunda
-            possible_paths = ['about', 'contact', 'profile', 'info']
-            for path in possible_paths:
-                new_url = urljoin(url, path)
-                try:
-                    async with session.get(new_url, headers=headers, timeout=aiohttp.ClientTimeout(total=TIMEOUT)) as sub_response:
-                        if sub_response.status == 200:
-                            sub_text = await sub_response.text()
-                            sub_soup = BeautifulSoup(sub_text, "html.parser")
-
-                            emails += re.findall(email_regex, sub_soup.text)
-                            for phone in re.findall(phone_regex, sub_soup.text):
-                                internacional, nacional = validar_e_formatar_telefone(phone)
-                                if internacional:
-                                    valid_phones.append(internacional)
-                            addresses += re.findall(address_regex, sub_soup.text)
-                            profiles = re.findall(social_media_regex, sub_soup.text)
-
-                            for profile in profiles:
-                                normalized_url = normalizar_social_media(f'https://{profile[0]}.com/{profile[1]}')
-                                if normalized_url:
-                                    key = normalized_url.split('/')[2]
-                                    if key not in social_media_profiles:
-                                        social_media_profiles[key] = normalized_url
-
-                            # Filtrar para garantir que apenas perfis principais sejam retornados
-                            valid_social_media_profiles = {}
-                            for key, url in social_media_profiles.items():
-                                if 'photo.php' in url or 'p/' in url:
-                                    continue  # Ignorar links de fotos ou vídeos
-                                valid_social_media_profiles[key] = url
-
-                            emails = list(set(emails))
-                            valid_phones = list(set(valid_phones))
-                            addresses = list(set(addresses))
-                            social_media_profiles = list(set(valid_social_media_profiles.values()))
-
-                            if any([emails, valid_phones, addresses, social_media_profiles]):
-                                break
-                except Exception as e:
-                    continue
+        for profile in page['social_media_profiles']:
+            adicionar_perfil(social_media_profiles, profile)
 
+        contact_info = {
+            'emails': page['emails'],
+            'phones': page['phones'],
+            'addresses': page['addresses'],
+            'social_media_profiles': filtrar_perfis_principais(social_media_profiles)
+        }
+        origem = url
+
+        if deep_scan and not any(contact_info.values()):
+            with medir('deep_scan'):
+                sub_page = await deep_scan_contact_info(url, session, headers, page['contact_links'])
+            if sub_page:
+                for profile in sub_page['social_media_profiles']:
+                    adicionar_perfil(social_media_profiles, profile)
+
+                contact_info = {
+                    'emails': sub_page['emails'],
+                    'phones': sub_page['phones'],
+                    'addresses': sub_page['addresses'],
+                    'social_media_profiles': filtrar_perfis_principais(social_media_profiles)
+                }
+                origem = sub_page['url']
+
+        # Página de onde os dados vieram (registrada como fonte de cada campo)
+        contact_info['url'] = origem
         return contact_info
     except asyncio.TimeoutError:
         return {'error': 'Timeout'}
     except Exception as e:
         return {'error': str(e)}
 
+# Mesmo que scrape_contact_info, mas dentro de um lote requisições concorrentes
+# para a mesma URL normalizada compartilham uma única busca e extração,
+# e o resultado fica guardado para as próximas queries do lote
+async def scrape_contact_info_compartilhado(url, session, deep_scan=False):
+    deduplicador = DEDUPLICADOR.get()
+    if deduplicador is None or not url:
+        return await scrape_contact_info(url, session, deep_scan)
+    chave = (normalizar_url(url), deep_scan)
+    return await deduplicador.do(chave, lambda: scrape_contact_info_com_prazo(url, session, deep_scan))
+
+# Busca compartilhada de um site: roda com o seu próprio prazo (e não com o que sobrou da
+# primeira query que pediu o site; a tarefa tem uma cópia do contexto, então isso não afeta
+# a query); cada query continua esperando só até o próprio prazo
+async def scrape_contact_info_com_prazo(url, session, deep_scan):
+    PRAZO.set(Prazo(ORCAMENTO))
+    return await scrape_contact_info(url, session, deep_scan)
+
+# Só as visitas que deram certo são reaproveitadas no lote; as com erro (timeout) são repetidas
+def contato_memorizavel(contact_info):
+    return not (isinstance(contact_info, dict) and 'error' in contact_info)
+
+# O mesmo para as queries: None (busca que estourou o prazo) não vale para as equivalentes
+def resultado_memorizavel(resultado):
+    return resultado is not None
+
 # Função para formatar o horário de funcionamento
 def formatar_horario_funcionamento(horarios_raw):
     if isinstance(horarios_raw, str):
@@ -354,15 +476,18 @@ def consolidar_informacoes(knowledge_data, contact_infos):
     phones_counter = Counter()
     addresses_counter = Counter()
     social_media_profiles = []
+    # Primeira página em que cada valor apareceu: (campo, valor) -> URL
+    origens = {}
 
     # Preencher os contadores com as informações extraídas
     for contact_info in contact_infos:
-        if 'emails' in contact_info:
-            emails_counter.update(contact_info['emails'])
-        if 'phones' in contact_info:
-            phones_counter.update(contact_info['phones'])
-        if 'addresses' in contact_info:
-            addresses_counter.update(contact_info['addresses'])
+        url = contact_info.get('url')
+        for campo, chave, contador in (('email', 'emails', emails_counter), ('phone', 'phones', phones_counter),
+                                       ('address', 'addresses', addresses_counter)):
+            if chave in contact_info:
+                contador.update(contact_info[chave])
+                for valor in contact_info[chave]:
+                    origens.setdefault((campo, valor), url)
         if 'social_media_profiles' in contact_info:
             social_media_profiles.extend(contact_info['social_media_profiles'])  # Redes sociais
 
@@ -383,31 +508,49 @@ def consolidar_informacoes(knowledge_data, contact_infos):
     if 'hours' in knowledge_data:
         hours_final = formatar_horario_funcionamento(knowledge_data['hours'])
 
-    # Retornar as informações consolidadas
-    return {
-        'email': email_final,
-        'phone': phone_final,
-        'address': address_final,
-        'social_media_profiles': social_media_profiles,
-        'hours': hours_final
-    }
-
-# Função principal para processar uma única query
-async def process_single_query(query, session, progress_bar):
+    # Fonte de cada campo: o Knowledge Graph ou a página onde o valor foi encontrado
+    sources = {}
+    for campo, valor in (('email', email_final), ('phone', phone_final), ('address', address_final), ('hours', hours_final)):
+        if not valor:
+            continue
+        if knowledge_data.get(campo):
+            sources[campo] = FONTE_KNOWLEDGE_GRAPH
+        elif origens.get((campo, valor)):
+            sources[campo] = origens[(campo, valor)]
 
+    # Retornar as informações consolidadas
+    return ContactInfo(
+        email=email_final,
+        phone=phone_final,
+        address=address_final,
+        social_media_profiles=social_media_profiles,
+        hours=hours_final,
+        sources=sources
+    )
+
+# Função principal para processar uma única query; retorna um QueryResult (ou None).
+# Se a busca for bloqueada, levanta BloqueioDetectado para que a query seja repetida depois;
+# se a busca falhar, retorna None ou, com levantar_falhas, levanta FalhaBusca (ex.: para uma fila).
+# Todas as etapas dividem o mesmo orçamento de tempo (ORCAMENTO): a busca tem o seu prazo
+# e os sites que não terminarem até o fim do orçamento ficam de fora do resultado.
+async def process_single_query(query, session, progress_bar=None, levantar_falhas=False):
+    prazo = Prazo(ORCAMENTO)
+    token = PRAZO.set(prazo)
     try:
-        resultados = await asyncio.wait_for(google_search(query, session), timeout=TIMEOUT)
+        with medir('query_busca'):
+            resultados = await asyncio.wait_for(google_search(query, session),
+                                                timeout=prazo.etapa(FRACOES_ETAPA['busca']).restante())
 
         tasks = []
         for resultado in resultados:
             link = resultado.get('link', '')
             if link and "http" in link:
-                tasks.append(scrape_contact_info(link, session, deep_scan=True))
+                tasks.append(scrape_contact_info_compartilhado(link, session, deep_scan=True))
 
         contact_infos = []
         if tasks:
-            for info in await asyncio.gather(*tasks):
-                contact_infos.append(info)
+            with medir('query_sites'):
+                contact_infos = await reunir_ate_o_prazo(tasks, prazo)
 
         knowledge_graph_data = None
         for resultado in resultados:
@@ -418,40 +561,166 @@ async def process_single_query(query, session, progress_bar):
         if knowledge_graph_data and 'hours' in knowledge_graph_data:
             knowledge_graph_data['hours'] = formatar_horario_funcionamento(knowledge_graph_data['hours'])
 
-        informacoes_consolidadas = consolidar_informacoes(knowledge_graph_data or {}, contact_infos)
-
-        resultado_json = {
-            "knowledge_graph": knowledge_graph_data,
-            "consolidated_contact_info": informacoes_consolidadas
-        }
+        with medir('consolidacao'):
+            informacoes_consolidadas = consolidar_informacoes(knowledge_graph_data or {}, contact_infos)
 
-        # Formatando o JSON para incluir caracteres especiais corretamente
-        return json.dumps(resultado_json, indent=4, ensure_ascii=False)
+        return QueryResult(
+            knowledge_graph=KnowledgeGraph.from_dict(knowledge_graph_data) if knowledge_graph_data else None,
+            contact_info=informacoes_consolidadas
+        )
 
-    except asyncio.TimeoutError:
-        pass
+    except asyncio.TimeoutError as e:
+        if levantar_falhas:
+            raise FalhaBusca(query, 'timeout') from e
+    except FalhaBusca:
+        if levantar_falhas:
+            raise
     finally:
-        progress_bar.update(1)  # Atualizar a barra global após processar a query
+        PRAZO.reset(token)
+        if progress_bar is not None:
+            progress_bar.update(1)  # Atualizar a barra global após processar a query
     return None
 
-# Função principal para processar várias queries
-async def process_queries(queries):
-    total_queries = len(queries)
-
-    async with aiohttp.ClientSession() as session:
-        start_time = time.time()  # Tempo de início
-        with tqdm_asyncio(total=total_queries, desc="Processing queries") as global_pbar:
-            tasks = [process_single_query(query, session, global_pbar) for query in queries]
-
-            # Coletar resultados e garantir que as barras de progresso sejam fechadas antes de imprimir
-            resultados = await asyncio.gather(*tasks)
-
-            # Retorna os resultados para serem usados externamente
-            return resultados
+# Mesmo que process_single_query, mas dentro de um lote queries equivalentes
+# (mesma forma canônica, ver canonical.py) compartilham uma única busca
+async def process_single_query_compartilhada(query, session, levantar_falhas=False):
+    consultas = CONSULTAS.get()
+    chave = canonicalizar_query(query)
+    if consultas is None or not chave:
+        return await process_single_query(query, session, levantar_falhas=levantar_falhas)
+    # A execução compartilhada sempre levanta a falha: cada chamada decide o que fazer com ela
+    try:
+        return await consultas.do(('busca', chave), lambda: process_single_query(query, session, levantar_falhas=True))
+    except FalhaBusca:
+        if levantar_falhas:
+            raise
+        return None
+
+# Função para processar um site já conhecido, sem passar pela busca do Google
+async def process_single_site(url, session, progress_bar=None):
+    token = PRAZO.set(Prazo(ORCAMENTO))
+    try:
+        contact_info = await scrape_contact_info_compartilhado(url, session, deep_scan=True)
+        return QueryResult(knowledge_graph=None, contact_info=consolidar_informacoes({}, [contact_info]))
+    finally:
+        PRAZO.reset(token)
+        if progress_bar is not None:
+            progress_bar.update(1)
+
+# Processa as queries e entrega o resultado de cada uma assim que ela termina,
+# com no máximo janela_queries() em andamento. Aceita qualquer iterável, síncrono ou
+# assíncrono (inclusive geradores), então nem a lista de entrada precisa estar toda em memória.
+# 'processar' permite trocar o processamento de cada item (padrão: process_single_query).
+# Itens bloqueados (BloqueioDetectado) saem com result None e a exceção em 'bloqueio'.
+# Queries (texto) equivalentes no mesmo lote são processadas uma vez e cada uma recebe o resultado.
+async def iterar_queries(queries, session=None, progress_bar=None, processar=None):
+    # Sem uma sessão compartilhada, cria uma com os limites padrão de conexão
+    if session is None:
+        async with ManagedSession() as session:
+            async for item in iterar_queries(queries, session, progress_bar, processar):
+                yield item
+        return
+
+    processar = processar or process_single_query
+
+    # Cada lote tem seu próprio deduplicador de URLs e de queries
+    deduplicador = SingleFlight(memorizavel=contato_memorizavel)
+    consultas = SingleFlight(memorizavel=resultado_memorizavel)
+
+    async def processar_item(query):
+        chave = canonicalizar_query(query) if isinstance(query, str) else None
+        if not chave:
+            return await processar(query, session, progress_bar)
+        executada = []
+
+        def executar():
+            executada.append(True)
+            return processar(query, session, progress_bar)
+
+        result = await consultas.do(('item', chave), executar)
+        # Quem só reaproveitou o resultado também conta no progresso
+        if not executada and progress_bar is not None:
+            progress_bar.update(1)
+        return result
+
+    async def process_timed_query(index, query):
+        # Cada tarefa tem uma cópia própria do contexto, então isso vale só para esta query
+        DEDUPLICADOR.set(deduplicador)
+        CONSULTAS.set(consultas)
+        inicio = time.time()
+        result, bloqueio = None, None
+        try:
+            with medir('query'):
+                result = await processar_item(query)
+        except BloqueioDetectado as e:
+            bloqueio = e
+        return {
+            'index': index,
+            'query': query,
+            'result': result,
+            'bloqueio': bloqueio,
+            'started_at': inicio,
+            'elapsed': time.time() - inicio
+        }
 
-        end_time = time.time()  # Tempo de término
-        elapsed_time = end_time - start_time  # Tempo decorrido
+    batch_start = time.time()
+    pendentes = set()
+    # Iteráveis assíncronos (ex.: reservas de uma fila) são consumidos sem bloquear o event loop
+    assincrono = hasattr(queries, '__aiter__')
+    entradas = aiter(queries) if assincrono else iter(queries)
+    index = 0
+    esgotado = False
+    try:
+        while pendentes or not esgotado:
+            # Completa a janela de queries em andamento (menor quando a busca está limitada)
+            while not esgotado and len(pendentes) < janela_queries():
+                try:
+                    query = await anext(entradas) if assincrono else next(entradas)
+                except (StopIteration, StopAsyncIteration):
+                    esgotado = True
+                    break
+                pendentes.add(asyncio.create_task(process_timed_query(index, query)))
+                index += 1
+
+            if not pendentes:
+                break
 
-        # Função principal para rodar o scraping com BeautifulSoup
-async def run_beautifulsoup_scraping(queries):
-    return await process_queries(queries)
\ No newline at end of file
+            concluidas, pendentes = await asyncio.wait(pendentes, return_when=asyncio.FIRST_COMPLETED)
+            for task in concluidas:
+                item = task.result()
+                item['batch_elapsed'] = time.time() - batch_start
+                yield item
+    finally:
+        # Se o consumidor parar antes do fim, não deixa tarefas órfãs
+        for task in pendentes:
+            task.cancel()
+
+# Função principal para processar várias queries (resultados na mesma ordem da entrada).
+# Queries equivalentes são buscadas uma vez só e o resultado volta para cada uma delas.
+async def process_queries(queries, session=None):
+    queries = list(queries)
+    representantes, grupos = agrupar_queries(queries)
+    resultados = [None] * len(representantes)
+
+    with tqdm_asyncio(total=len(representantes), desc="Processing queries") as global_pbar:
+        async for item in iterar_queries(representantes, session, global_pbar):
+            resultados[item['index']] = item['result']
+
+    return [resultados[grupo] for grupo in grupos]
+
+# Função principal para rodar o scraping com BeautifulSoup
+async def run_beautifulsoup_scraping(queries, session=None):
+    return await process_queries(queries, session)
+
+# Roda o scraping gravando cada resultado em um arquivo JSONL assim que a query termina
+async def run_beautifulsoup_to_jsonl(queries, caminho, session=None):
+    with JsonlSink(caminho) as sink:
+        async for item in iterar_queries(queries, session):
+            result = item['result']
+            sink.escrever({
+                'query': item['query'],
+                'elapsed': round(item['elapsed'], 3),
+                'result': result.to_dict() if result else None,
+                'blocked': item['bloqueio'].motivo if item['bloqueio'] else None
+            })
+        return sink.escritos
\ No newline at end of file
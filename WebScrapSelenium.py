@@ -4,10 +4,21 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from webdriver_manager.chrome import ChromeDriverManager
 from collections import Counter
-import time
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import threading
+from cache import normalizar_url
+from canonical import agrupar_queries
+from driver_pool import DriverPool, TAMANHO_POOL
+from extractor import extrair_contatos
+from metrics import medir
+from models import SeleniumContactInfo
+from phones import validar_lote
+from waits import (esperar_algum_elemento, esperar_altura_mudar, esperar_documento_pronto,
+                   esperar_pagina_carregada, esperar_troca_de_pagina)
 import re
 
-# Função para extrair informações de uma página da web
 # Função para extrair informações de uma página da web
 def extract_info_from_page(driver, current_url):
     data = {
@@ -23,28 +34,44 @@ def extract_info_from_page(driver, current_url):
         data["social_media_profiles"] = [current_url]
         return data
 
+    # Uma única leitura do page_source (cada acesso busca o DOM inteiro no navegador)
+    # e uma única passada do extrator sobre ele
+    contatos = extrair_contatos(driver.page_source)
+
     # Capturando email
-    emails = re.findall(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+", driver.page_source)
-    if emails:
-        data["email"] = emails[0]  # Pegando o primeiro email encontrado
+    if contatos["emails"]:
+        data["email"] = contatos["emails"][0]  # Pegando o primeiro email encontrado
 
-    # Capturando telefone
-    phones = re.findall(r'\(?\d{2}\)?\s?\d{4,5}-\d{4}', driver.page_source)
-    if phones:
-        data["phone"] = phones[0]  # Pegando o primeiro telefone encontrado
+    # Capturando telefone: o primeiro candidato válido (o page_source inclui scripts,
+    # com timestamps e ids que o padrão também captura)
+    telefones = validar_lote(contatos["phones"])
+    if telefones:
+        data["phone"] = telefones[0]
 
-    # Tentativa de capturar endereço (simplificado, pode ser ajustado)
-    address = re.search(r"\d{5}-\d{3}", driver.page_source)
-    if address:
-        data["address"] = address.group(0)  # Pegando o primeiro CEP encontrado
+    # Endereço completo quando reconhecido, senão o primeiro CEP encontrado
+    if contatos["addresses"]:
+        data["address"] = contatos["addresses"][0]
+    elif contatos["ceps"]:
+        data["address"] = contatos["ceps"][0]
 
     # Capturando links de perfis de redes sociais
-    social_links = re.findall(r'(https?://(?:www\.)?(?:facebook|instagram|linkedin|twitter)\.com/[^\s]+)', driver.page_source)
-    data["social_media_profiles"] = social_links
+    data["social_media_profiles"] = contatos["social_links"]
 
     return data
 
 
+# Resolve o caminho do chromedriver uma única vez por processo.
+# O lock evita downloads simultâneos quando vários navegadores são abertos sob demanda.
+_LOCK_CHROMEDRIVER = threading.Lock()
+
+@lru_cache(maxsize=None)
+def _instalar_chromedriver():
+    return ChromeDriverManager().install()
+
+def resolver_chromedriver():
+    with _LOCK_CHROMEDRIVER:
+        return _instalar_chromedriver()
+
 # Configurando o driver do Selenium
 def configure_driver():
     options = webdriver.ChromeOptions()
@@ -61,26 +88,50 @@ def configure_driver():
     options.add_argument("--disable-backgrounding-occluded-windows")  # Evita que páginas em background percam foco
 
 
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    driver = webdriver.Chrome(service=Service(resolver_chromedriver()), options=options)
     return driver
 
+# Navegador da busca em camadas (ver tiered_fetch.py): ele existe para renderizar páginas que
+# dependem de JavaScript, então o JavaScript fica ligado e a janela tem tamanho de desktop
+def configure_render_driver():
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument("--disable-blink-features=AutomationControlled")  # Evita detecção de automação
+    options.add_argument("--window-size=1366,900")
+    options.add_argument("--blink-settings=imagesEnabled=false")  # Imagens não são necessárias para o HTML
+    options.add_argument("--disable-background-timer-throttling")
+    options.add_argument("--disable-backgrounding-occluded-windows")
+
+    driver = webdriver.Chrome(service=Service(resolver_chromedriver()), options=options)
+    return driver
+
+# Página inicial da busca; pode ser trocada por um servidor local (ver benchmark.py)
+GOOGLE_URL = 'https://www.google.com/'
+
+# Containers onde o Google coloca os resultados da busca
+RESULT_CONTAINERS = [(By.ID, 'search'), (By.ID, 'rso'), (By.ID, 'botstuff')]
+
 # Realizando a busca no Google
 def search_google(driver, query):
-    driver.get('https://www.google.com/')
+    driver.get(GOOGLE_URL)
 
     # Aceitar os cookies do Google, se necessário
-    time.sleep(1)  # Aguardar o carregamento da página
+    # Aguarda o que aparecer primeiro: o aviso de cookies ou a caixa de busca
+    esperar_algum_elemento(driver, [(By.ID, 'L2AGLb'), (By.NAME, 'q')])
     try:
         accept_button = driver.find_element(By.XPATH, '//*[@id="L2AGLb"]/div')
         accept_button.click()
     except:
         pass  # Caso o botão de aceitar cookies não apareça
 
-    search_box = driver.find_element(By.NAME, 'q')
+    search_box = esperar_algum_elemento(driver, [(By.NAME, 'q')]) or driver.find_element(By.NAME, 'q')
     search_box.send_keys(query)
     search_box.send_keys(Keys.RETURN)
 
-    time.sleep(3)  # Aguardar a página de resultados carregar
+    # Aguardar a página de resultados carregar
+    esperar_algum_elemento(driver, RESULT_CONTAINERS)
 
 # Adiciona função para rolar até o final da página para carregar mais resultados
 def scroll_to_bottom(driver):
@@ -88,37 +139,66 @@ def scroll_to_bottom(driver):
 
     while True:
         driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(2)  # Aguardar o carregamento de mais resultados
 
-        new_height = driver.execute_script("return document.body.scrollHeight")
+        # Aguardar o carregamento de mais resultados (retorna assim que a altura mudar)
+        new_height = esperar_altura_mudar(driver, last_height)
         if new_height == last_height:  # Verifica se mais resultados foram carregados
             break
         last_height = new_height
 
-# Coletando URLs dos resultados
-def get_google_results(driver):
-    urls = []
-
+# Quantidade de URLs de resultados visitadas por query
+MAX_RESULTADOS = 7
+
+# Links que não são resultados: páginas do próprio Google e esquemas que não são http
+def is_result_link(href):
+    if not href:
+        return False
+    partes = urlsplit(href)
+    if partes.scheme not in ('http', 'https') or not partes.hostname:
+        return False
+    host = partes.hostname.lower()
+    return not ('google.' in host or host.endswith(('googleusercontent.com', 'gstatic.com', 'youtube.com')))
+
+# Percorre as páginas de resultados sob demanda, entregando os links de cada página.
+# A próxima rolagem ou página só é carregada se quem consome pedir mais links.
+def iterar_links_google(driver):
     while True:
-        time.sleep(2)  # Dar tempo para os resultados carregarem
+        # Aguardar os resultados carregarem
+        esperar_algum_elemento(driver, RESULT_CONTAINERS)
+        esperar_documento_pronto(driver)
         # Seleciona os links de resultados visíveis na página
-        links = driver.find_elements(By.XPATH, '//a[@href]')
-        page_urls = [link.get_attribute('href') for link in links if "google.com" not in link.get_attribute('href')]
-
-        # Adiciona os novos URLs encontrados
-        urls.extend(page_urls)
+        yield from (link.get_attribute('href') for link in driver.find_elements(By.XPATH, '//a[@href]'))
 
         # Tenta carregar mais resultados rolando a página
-        scroll_to_bottom(driver)
+        last_height = driver.execute_script("return document.body.scrollHeight")
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        if esperar_altura_mudar(driver, last_height) != last_height:
+            continue
 
         # Tenta avançar para a próxima página
         try:
             next_button = driver.find_element(By.ID, 'pnnext')  # Localiza o botão "Próxima Página"
+            pagina_atual = driver.find_element(By.TAG_NAME, 'html')
             next_button.click()  # Clica no botão para ir para a próxima página de resultados
+            esperar_troca_de_pagina(driver, pagina_atual)
         except:
-            break  # Se o botão "Próxima Página" não for encontrado, sair do loop
+            return  # Se o botão "Próxima Página" não for encontrado, não há mais resultados
 
-    return urls[:7]  # Limitar a coleta a 20 URLs (ajustável)
+# Coletando URLs dos resultados: para assim que houver max_resultados URLs distintas
+def get_google_results(driver, max_resultados=MAX_RESULTADOS):
+    urls = []
+    vistas = set()
+    for href in iterar_links_google(driver):
+        if not is_result_link(href):
+            continue
+        chave = normalizar_url(href)
+        if chave in vistas:
+            continue
+        vistas.add(chave)
+        urls.append(href)
+        if len(urls) >= max_resultados:
+            break
+    return urls
 
 import re
 from collections import Counter
@@ -161,11 +241,7 @@ def clean_social_links(links):
 # Função para consolidar os resultados
 # Consolida os resultados
 def consolidate_results(results):
-    final_data = {
-        "email": [],
-        "phone": "",
-        "social_media_profiles": []
-    }
+    final_data = SeleniumContactInfo()
 
     phones = []
     social_media_profiles = set()  # Usaremos um set para evitar duplicatas
@@ -174,7 +250,7 @@ def consolidate_results(results):
         info = result['info']
 
         if info['email'] and validate_email(info['email']):
-            final_data['email'].append(info['email'])
+            final_data.email.append(info['email'])
 
         if info['phone']:
             phones.append(info['phone'])
@@ -185,37 +261,64 @@ def consolidate_results(results):
 
     if phones:
         most_common_phone = Counter(phones).most_common(1)[0][0]
-        final_data['phone'] = most_common_phone
+        final_data.phone = most_common_phone
 
-    final_data['social_media_profiles'] = clean_social_links(list(social_media_profiles))
+    final_data.social_media_profiles = clean_social_links(list(social_media_profiles))
 
     return final_data
 
-def run_scraping(query):
-    driver = configure_driver()
+# max_resultados: quantas URLs de resultados distintas visitar (a busca para de paginar ao atingir)
+def run_scraping(query, pool=None, max_resultados=MAX_RESULTADOS):
+    with medir('selenium_query'):
+        # Com um pool, reaproveita um navegador já aberto
+        if pool is not None:
+            with pool.acquire() as driver:
+                return scrape_with_driver(driver, query, max_resultados)
 
-    try:
+        driver = configure_driver()
+        try:
+            return scrape_with_driver(driver, query, max_resultados)
+        finally:
+            driver.quit()
+
+# Cada etapa é medida nas métricas (ver metrics.py); erros das páginas continuam sendo ignorados,
+# mas ficam contados por categoria
+def scrape_with_driver(driver, query, max_resultados=MAX_RESULTADOS):
+    with medir('selenium_busca'):
         search_google(driver, query)
-        urls = get_google_results(driver)
+    with medir('selenium_resultados'):
+        urls = get_google_results(driver, max_resultados)
 
-        results = []
-        for url in urls:
-            try:
+    results = []
+    for url in urls:
+        try:
+            with medir('selenium_pagina'):
                 driver.get(url)
-                time.sleep(3)
+            with medir('selenium_espera'):
+                esperar_pagina_carregada(driver)
+            with medir('selenium_extracao'):
                 info = extract_info_from_page(driver, url)
-                results.append({"url": url, "info": info})
-            except Exception as e:
-                pass
-        consolidated_info = consolidate_results(results)
-        return consolidated_info
-
-    finally:
-        driver.quit()
+            results.append({"url": url, "info": info})
+        except Exception as e:
+            pass
+    consolidated_info = consolidate_results(results)
+    return consolidated_info
+
+# Função para rodar o scraping em múltiplas queries, distribuídas entre os navegadores do pool
+def run_scraping_multiple(queries, workers=TAMANHO_POOL, pool=None, max_resultados=MAX_RESULTADOS):
+    if pool is None:
+        workers = max(1, min(workers, len(agrupar_queries(queries)[0])))
+        resolver_chromedriver()  # Resolve o binário antes de abrir os navegadores em paralelo
+        with DriverPool(configure_driver, tamanho=workers) as pool:
+            pool.aquecer()
+            return run_scraping_multiple(queries, workers, pool, max_resultados)
+
+    # Queries equivalentes (ver canonical.py) são raspadas uma vez só
+    representantes, grupos = agrupar_queries(queries)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda query: run_scraping(query, pool, max_resultados), representantes))
 
-# Função para rodar o scraping em múltiplas queries
-def run_scraping_multiple(queries):
     all_results = {}
-    for query in queries:
-        all_results[query] = run_scraping(query)
+    for query, grupo in zip(queries, grupos):
+        all_results[query] = results[grupo]
     return all_results
\ No newline at end of file
@@ -1,38 +1,39 @@
 import asyncio
 import json
-from WebScrapSelenium import run_scraping_multiple
-from WebScrapBeautifulSoup import run_beautifulsoup_scraping
+from concurrent.futures import ThreadPoolExecutor
+from WebScrapSelenium import configure_driver, configure_render_driver, resolver_chromedriver, run_scraping
+from WebScrapBeautifulSoup import configurar_cache, configurar_controle_taxa, configurar_escalonamento, iterar_queries, process_single_query
+from driver_pool import DriverPool, TAMANHO_POOL
+from connection import ManagedSession
+from metrics import categorizar, configurar_metricas, registrar_erro
+from models import FONTE_KNOWLEDGE_GRAPH, CompanyData, ContactInfo, KnowledgeGraph, SeleniumContactInfo
+from rate_control import BloqueioDetectado
+from request_policy import ORCAMENTO_QUERY
+from store import EnrichmentStore, site_do_resultado
 from tqdm.asyncio import tqdm_asyncio
 import time
 
+# Navegadores usados só para as páginas que precisam de JavaScript (abertos sob demanda)
+TAMANHO_POOL_ESCALONAMENTO = 2
+# Roda também o pipeline completo do Selenium (busca e todas as páginas no navegador)
+PIPELINE_SELENIUM_COMPLETO = False
+
+# Tempo máximo de cada motor por query; ao estourar, a query sai só com o outro motor
+TIMEOUT_BEAUTIFULSOUP_QUERY = ORCAMENTO_QUERY + 10
+TIMEOUT_SELENIUM_QUERY = 120
+
+# Banco com os dados combinados de execuções anteriores (None desliga)
+ARQUIVO_STORE = 'enriquecimento.db'
+
+# Combina o resultado do Selenium (SeleniumContactInfo) com o do BeautifulSoup (QueryResult);
+# qualquer um dos dois pode faltar (None)
 async def combine_results(selenium_data, beautifulsoup_data):
-    # Verificar se os dados do BeautifulSoup são válidos
-    if beautifulsoup_data is None:
-        bs_data = {}
-    else:
-        try:
-            # Tentar carregar diretamente o beautifulsoup_data
-            bs_data = json.loads(beautifulsoup_data)
-        except (json.JSONDecodeError, TypeError) as e:
-            print(f"Erro ao carregar BeautifulSoup data: {e}")
-            bs_data = {}
-
-    # Garantir que bs_data seja um dicionário e não None
-    if not isinstance(bs_data, dict):
-        bs_data = {}
-
-    # Garantir que bs_data sempre tenha um dicionário para knowledge_graph e consolidated_contact_info
-    knowledge_graph = bs_data.get("knowledge_graph", {})
-    consolidated_contact_info = bs_data.get("consolidated_contact_info", {})
-
-    # Garantir que knowledge_graph e consolidated_contact_info não sejam None
-    if not isinstance(knowledge_graph, dict):
-        knowledge_graph = {}
-    if not isinstance(consolidated_contact_info, dict):
-        consolidated_contact_info = {}
+    selenium_data = selenium_data or SeleniumContactInfo()
+    knowledge_graph = (beautifulsoup_data.knowledge_graph if beautifulsoup_data else None) or KnowledgeGraph()
+    consolidated_contact_info = (beautifulsoup_data.contact_info if beautifulsoup_data else None) or ContactInfo()
 
     # Combinar redes sociais de Selenium e BeautifulSoup e remover duplicatas
-    combined_social_media = list(set(selenium_data.get("social_media_profiles", []) + consolidated_contact_info.get("social_media_profiles", [])))
+    combined_social_media = list(set(selenium_data.social_media_profiles + consolidated_contact_info.social_media_profiles))
 
     # Normalizar URLs de redes sociais, removendo trailing slashes ou subpaths desnecessários
     normalized_social_media = []
@@ -43,55 +44,169 @@ async def combine_results(selenium_data, beautifulsoup_data):
         if profile not in normalized_social_media:
             normalized_social_media.append(profile)
 
-    # Criar o dicionário consolidado usando os dados disponíveis
-    consolidated_data = {
-        "name": knowledge_graph.get("title", ""),
-        "rating": knowledge_graph.get("rating", ""),
-        "review_count": knowledge_graph.get("review_count", ""),
-        "address": consolidated_contact_info.get("address", ""),
-        "phone": selenium_data.get("phone", consolidated_contact_info.get("phone", "")),
-        "email": selenium_data.get("email", consolidated_contact_info.get("email", [])),
-        "hours": consolidated_contact_info.get("hours", {}),
-        "social_media_profiles": normalized_social_media
-    }
+    # Origem de cada campo: as páginas do BeautifulSoup e o Knowledge Graph; o que veio do Selenium fica sem origem
+    sources = dict(consolidated_contact_info.sources or {})
+    do_knowledge_graph = {'name': knowledge_graph.title, 'rating': knowledge_graph.rating, 'review_count': knowledge_graph.review_count}
+    sources.update((campo, FONTE_KNOWLEDGE_GRAPH) for campo, valor in do_knowledge_graph.items() if valor)
+    for campo, valor in (('phone', selenium_data.phone), ('email', selenium_data.email)):
+        if valor:
+            sources.pop(campo, None)
+
+    # Criar o registro consolidado usando os dados disponíveis (o Selenium tem preferência quando encontrou algo)
+    consolidated_data = CompanyData(
+        name=knowledge_graph.title or "",
+        rating=knowledge_graph.rating or "",
+        review_count=knowledge_graph.review_count or "",
+        address=consolidated_contact_info.address or "",
+        phone=selenium_data.phone or consolidated_contact_info.phone or "",
+        email=selenium_data.email or consolidated_contact_info.email or [],
+        hours=consolidated_contact_info.hours or {},
+        social_media_profiles=normalized_social_media,
+        sources=sources
+    )
 
     # Exibir o resultado consolidado para depuração
-    print(f"Consolidated Data: {json.dumps(consolidated_data, indent=4, ensure_ascii=False)}")
+    print(f"Consolidated Data: {consolidated_data.to_json(indent=4)}")
 
     return consolidated_data
 
+# Cria o processamento combinado de uma query: roda os motores habilitados ao mesmo tempo,
+# cada um com seu tempo máximo, e combina o que tiver terminado.
+# Com exigir_resultado, levanta o erro quando todos os motores falharam (ex.: para a query voltar a uma fila).
+# Uma busca bloqueada (BloqueioDetectado) sempre é levantada: a query não foi processada e deve ser repetida.
+def criar_processador_combinado(usar_selenium, usar_beautifulsoup, pool=None, executor=None, workers=TAMANHO_POOL,
+                                exigir_resultado=False):
+    # Vagas do Selenium: só são liberadas quando o navegador realmente termina,
+    # mesmo que a query já tenha desistido de esperar por ele
+    vagas_selenium = asyncio.Semaphore(workers)
+
+    async def rodar_selenium(query):
+        await vagas_selenium.acquire()
+        future = asyncio.get_running_loop().run_in_executor(executor, run_scraping, query, pool)
+        future.add_done_callback(lambda _: vagas_selenium.release())
+        return await asyncio.wait_for(asyncio.shield(future), timeout=TIMEOUT_SELENIUM_QUERY)
+
+    async def rodar_beautifulsoup(query, session):
+        # Uma busca que falhou levanta FalhaBusca em vez de virar um resultado vazio
+        return await asyncio.wait_for(process_single_query(query, session, levantar_falhas=True),
+                                      timeout=TIMEOUT_BEAUTIFULSOUP_QUERY)
+
+    async def processar(query, session, progress_bar=None):
+        try:
+            tarefas = {}
+            if usar_beautifulsoup:
+                tarefas['beautifulsoup'] = asyncio.ensure_future(rodar_beautifulsoup(query, session))
+            if usar_selenium:
+                tarefas['selenium'] = asyncio.ensure_future(rodar_selenium(query))
+
+            resultados = {}
+            erro, bloqueio = None, None
+            for motor, tarefa in tarefas.items():
+                try:
+                    resultados[motor] = await tarefa
+                except BloqueioDetectado as e:
+                    resultados[motor] = None
+                    bloqueio = e
+                except Exception as e:
+                    registrar_erro(motor, categorizar(e))
+                    resultados[motor] = None
+                    erro = e
+            if bloqueio is not None:
+                raise bloqueio
+            if exigir_resultado and erro is not None and all(resultado is None for resultado in resultados.values()):
+                raise erro
+            return await combine_results(resultados.get('selenium'), resultados.get('beautifulsoup'))
+        finally:
+            if progress_bar is not None:
+                progress_bar.update(1)
+
+    return processar
+
+# Entrega o registro combinado de cada query assim que os motores habilitados terminam
+# aquela query, sem esperar o lote inteiro. Cada item traz index, query, result (CompanyData) e elapsed.
+async def iterar_resultados_combinados(queries, session=None, usar_selenium=PIPELINE_SELENIUM_COMPLETO,
+                                       usar_beautifulsoup=True, workers=TAMANHO_POOL, progress_bar=None):
+    if not usar_selenium:
+        processar = criar_processador_combinado(False, usar_beautifulsoup)
+        async for item in iterar_queries(queries, session, progress_bar, processar=processar):
+            yield item
+        return
+
+    resolver_chromedriver()  # Resolve o binário antes de abrir os navegadores em paralelo
+    with DriverPool(configure_driver, tamanho=workers) as pool, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix='selenium') as executor:
+        processar = criar_processador_combinado(True, usar_beautifulsoup, pool, executor, workers)
+        async for item in iterar_queries(queries, session, progress_bar, processar=processar):
+            yield item
+
 async def main():
     queries = [
         "Setup Tecnologia",
         "openix solucoes belo horizonte"
     ]
 
-    start_time = time.time()  # Registrar o tempo no início da execução
+    # Cache de respostas em disco: use modo='replay' para reprocessar sem acessar a rede
+    configurar_cache(modo='normal')
 
-    # Rodar o scraping com Selenium e BeautifulSoup em paralelo para todas as queries
-    selenium_task = asyncio.to_thread(run_scraping_multiple, queries)  # Converter função síncrona para assíncrona
-    beautifulsoup_task = run_beautifulsoup_scraping(queries)  # Já é assíncrona
+    # Métricas por etapa (busca, sites, parsing, Selenium) desta execução
+    metricas = configurar_metricas()
 
-    # Exibir uma barra de progresso enquanto as tarefas estão em execução
-    selenium_results, beautifulsoup_results = await tqdm_asyncio.gather(
-        selenium_task,
-        beautifulsoup_task,
-        desc="Processando scraping",
-        total=2
-    )
+    # Taxa por host ajustada pelas respostas de bloqueio da busca
+    controle_taxa = configurar_controle_taxa()
 
-    # Combinar os resultados de cada query
-    for query, selenium_result in selenium_results.items():
-        beautifulsoup_result = beautifulsoup_results[queries.index(query)]
-        combined_result = await combine_results(selenium_result, beautifulsoup_result)
+    start_time = time.time()  # Registrar o tempo no início da execução
 
-        # Exibir o resultado combinado para cada empresa
-        print(f"\nResultado Combinado para '{query}':")
+    # Só as empresas novas, desatualizadas ou incompletas no store são buscadas de novo
+    store = EnrichmentStore(ARQUIVO_STORE) if ARQUIVO_STORE else None
+    if store is not None:
+        pendentes = []
+        for query in queries:
+            guardado = None if store.precisa_atualizar(query) else store.resultado(query)
+            if guardado is None:
+                pendentes.append(query)
+            else:
+                print(f"\nDados recentes no store para '{query}': {guardado.to_json(indent=4)}")
+        queries = pendentes
+
+    # Os sites são buscados por HTTP; só os que dependem de JavaScript vão para um navegador
+    with DriverPool(configure_render_driver, tamanho=TAMANHO_POOL_ESCALONAMENTO) as pool:
+        escalonador = configurar_escalonamento(pool)
+
+        # Sessão HTTP compartilhada, com limites de conexões globais e por host
+        async with ManagedSession() as session:
+            # Cada query é combinada e exibida assim que os motores terminam aquela query
+            primeiro_resultado = None
+            with tqdm_asyncio(total=len(queries), desc="Processando scraping") as progress_bar:
+                async for item in iterar_resultados_combinados(queries, session, progress_bar=progress_bar):
+                    if primeiro_resultado is None:
+                        primeiro_resultado = time.time() - start_time
+
+                    # Buscas bloqueadas não viram um registro vazio no store: a empresa continua pendente
+                    if item['bloqueio'] is not None:
+                        print(f"\nBusca bloqueada para '{item['query']}': {item['bloqueio']} (tente de novo mais tarde)")
+                        continue
+
+                    # Exibir o resultado combinado para cada empresa
+                    print(f"\nResultado Combinado para '{item['query']}' ({item['elapsed']:.2f} s):")
+                    if store is not None and item['result'] is not None:
+                        store.registrar(item['query'], site_do_resultado(item['result']), item['result'])
+
+            print(f"Estatísticas de conexão: {json.dumps(session.estatisticas(), indent=4, ensure_ascii=False)}")
+        print(f"Busca em camadas: {json.dumps(escalonador.estatisticas(), indent=4, ensure_ascii=False)}")
+        configurar_escalonamento(None)
+
+    if store is not None:
+        print(f"Store: {json.dumps(store.estatisticas(), indent=4, ensure_ascii=False)}")
+        store.close()
 
     # Calcular o tempo total de execução
     end_time = time.time()
     total_time = end_time - start_time
+    if primeiro_resultado is not None:
+        print(f"\nTempo até o primeiro resultado: {primeiro_resultado:.2f} segundos")
     print(f"\nTempo total de execução: {total_time:.2f} segundos")
+    print(f"Controle de taxa: {json.dumps(controle_taxa.estatisticas(), indent=4, ensure_ascii=False)}")
+    print(f"Métricas por etapa: {json.dumps(metricas.to_dict(), indent=4, ensure_ascii=False)}")
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
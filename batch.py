@@ -0,0 +1,282 @@
+import argparse
+import asyncio
+import csv
+import hashlib
+import os
+import re
+from functools import partial
+
+from tqdm.asyncio import tqdm_asyncio
+
+from WebScrapBeautifulSoup import (FalhaBusca, configurar_cache, configurar_controle_taxa, configurar_fetch, configurar_retentativas,
+                                   iterar_queries, process_single_query_compartilhada, process_single_site)
+from cep import VIACEP_URL, CepResolver, resultado_definitivo
+from connection import ManagedSession
+from fetch_policy import MAX_BYTES_RESPOSTA
+from metrics import configurar_metricas
+from models import ContactInfo, KnowledgeGraph
+from request_policy import HEDGE_APOS, ORCAMENTO_QUERY, TENTATIVAS
+from sinks import JsonlSink
+from store import MAX_IDADE, EnrichmentStore, site_do_resultado
+
+# Colunas do CSV de entrada (formato do MicroSocial.csv)
+COLUNA_TITULO = 'Título'
+COLUNA_TELEFONE = 'Telefone'
+COLUNA_ENDERECO = 'Endereço'
+COLUNA_SITE = 'WebSite'
+
+# Colunas acrescentadas em cada linha da saída
+COLUNAS_ENRIQUECIDAS = ['email', 'telefone_encontrado', 'endereco_encontrado', 'redes_sociais', 'nome_google', 'avaliacao', 'fonte',
+                        'cep', 'cep_valido', 'cidade_cep']
+
+# Vezes que as linhas bloqueadas pelo host da busca voltam para o fim do lote (depois da pausa)
+RODADAS_BLOQUEIO = 2
+
+# "..., Piracicaba - SP, 13416-320" -> "Piracicaba"
+PADRAO_CIDADE = re.compile(r',\s*([^,]+?)\s*-\s*[A-Z]{2}\b')
+
+
+# Lê o CSV linha a linha, sem carregar o arquivo inteiro.
+# As colunas do MicroSocial.csv vêm com espaços de alinhamento, que são removidos.
+def ler_linhas(caminho):
+    with open(caminho, encoding='utf-8', newline='') as arquivo:
+        leitor = csv.reader(arquivo, skipinitialspace=True)
+        cabecalho = [coluna.strip() for coluna in next(leitor, [])]
+        for numero, valores in enumerate(leitor, start=1):
+            if not any(valor.strip() for valor in valores):
+                continue
+            yield numero, {coluna: valor.strip() for coluna, valor in zip(cabecalho, valores)}
+
+# Identifica a linha de forma estável entre execuções (posição + conteúdo)
+def chave_linha(numero, linha):
+    conteudo = '|'.join([linha.get(COLUNA_TITULO, ''), linha.get(COLUNA_ENDERECO, ''), linha.get(COLUNA_SITE, '')])
+    return f"{numero}:{hashlib.sha1(conteudo.encode('utf-8')).hexdigest()[:12]}"
+
+def extrair_cidade(endereco):
+    match = PADRAO_CIDADE.search(endereco or '')
+    return match.group(1) if match else ''
+
+# Monta a query de busca: nome da empresa e cidade (se ainda não estiver no nome)
+def montar_query(linha):
+    titulo = linha.get(COLUNA_TITULO, '')
+    cidade = extrair_cidade(linha.get(COLUNA_ENDERECO, ''))
+    if cidade and cidade.lower() not in titulo.lower():
+        return f'{titulo} {cidade}'
+    return titulo
+
+def site_da_linha(linha):
+    site = linha.get(COLUNA_SITE, '')
+    return site if site.startswith(('http://', 'https://')) else None
+
+
+# Registro das linhas já concluídas, um por linha de arquivo (apenas acréscimos)
+class Checkpoint:
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.concluidas = set()
+        if os.path.exists(caminho):
+            with open(caminho, encoding='utf-8') as arquivo:
+                self.concluidas = {linha.strip() for linha in arquivo if linha.strip()}
+        self._arquivo = open(caminho, 'a', encoding='utf-8')
+
+    def __contains__(self, chave):
+        return chave in self.concluidas
+
+    def marcar(self, chave):
+        self._arquivo.write(chave + '\n')
+        self._arquivo.flush()
+        self.concluidas.add(chave)
+
+    def close(self):
+        self._arquivo.close()
+
+
+# Escreve as linhas enriquecidas no CSV de saída à medida que ficam prontas
+class CsvSink:
+    def __init__(self, caminho, colunas):
+        novo = not os.path.exists(caminho) or os.path.getsize(caminho) == 0
+        self._arquivo = open(caminho, 'a', encoding='utf-8', newline='')
+        self._escritor = csv.DictWriter(self._arquivo, fieldnames=colunas, extrasaction='ignore')
+        if novo:
+            self._escritor.writeheader()
+
+    def escrever(self, linha):
+        self._escritor.writerow(linha)
+        self._arquivo.flush()
+
+    def close(self):
+        self._arquivo.close()
+
+
+def tem_contato(resultado):
+    return bool(resultado and resultado.contact_info and resultado.contact_info.tem_contato())
+
+# Valida os CEPs do endereço da planilha e do endereço encontrado; retorna o primeiro
+async def validar_cep_linha(linha, resultado, resolver):
+    info = resultado.contact_info if resultado else None
+    enderecos = [linha.get(COLUNA_ENDERECO, ''), (info.address if info else None) or '']
+    validacoes = await resolver.validar_enderecos(enderecos)
+    return next(iter(validacoes.items()), None)
+
+# Processa uma linha: usa o site conhecido quando houver e só busca no Google
+# se não houver site ou se o site não trouxer nenhum contato (linhas com queries
+# equivalentes compartilham a mesma busca).
+# Com um store, empresas com dados recentes e completos saem do store, sem acessar a rede.
+# Retorna (fonte, resultado, cep, erro); 'erro' é a FalhaBusca quando a busca não respondeu.
+async def processar_linha(tarefa, session, progress_bar=None, resolver=None, store=None):
+    chave, linha = tarefa
+    try:
+        fonte, resultado = 'busca', None
+        site = site_da_linha(linha)
+        if store is not None and not store.precisa_atualizar(linha.get(COLUNA_TITULO), site):
+            fonte, resultado = 'store', store.resultado(linha.get(COLUNA_TITULO), site)
+        elif site:
+            resultado = await process_single_site(site, session)
+            if tem_contato(resultado):
+                fonte = 'site'
+        if fonte == 'busca':
+            try:
+                resultado = await process_single_query_compartilhada(montar_query(linha), session, levantar_falhas=True)
+            except FalhaBusca as e:
+                return fonte, None, None, e
+        if store is not None and fonte != 'store' and resultado is not None:
+            store.registrar(linha.get(COLUNA_TITULO), site or site_do_resultado(resultado), resultado)
+
+        cep = await validar_cep_linha(linha, resultado, resolver) if resolver else None
+        return fonte, resultado, cep, None
+    finally:
+        if progress_bar is not None:
+            progress_bar.update(1)
+
+def enriquecer(linha, fonte, resultado, cep=None):
+    knowledge_graph = (resultado.knowledge_graph if resultado else None) or KnowledgeGraph()
+    info = (resultado.contact_info if resultado else None) or ContactInfo()
+    cep_valido, dados_cep = (cep[1] if cep else ('', {}))
+    # Um erro na consulta (rede, cache) não diz se o CEP é válido: a coluna fica vazia
+    if cep and not resultado_definitivo(cep[1]):
+        cep_valido = ''
+    return dict(
+        linha,
+        email=info.email or '',
+        telefone_encontrado=info.phone or '',
+        endereco_encontrado=info.address or '',
+        redes_sociais=' '.join(info.social_media_profiles or []),
+        nome_google=knowledge_graph.title or '',
+        avaliacao=knowledge_graph.rating or '',
+        fonte=fonte,
+        cep=cep[0] if cep else '',
+        cep_valido={True: 'sim', False: 'não'}.get(cep_valido, ''),
+        cidade_cep=dados_cep.get('localidade', '') if isinstance(dados_cep, dict) else ''
+    )
+
+# Roda o lote inteiro. Linhas já registradas no checkpoint são puladas,
+# então uma execução interrompida continua de onde parou. Linhas que continuam
+# bloqueadas depois de RODADAS_BLOQUEIO ficam fora do checkpoint para a próxima execução,
+# assim como as linhas cuja busca falhou (rede, prazo, resposta fora do cache no modo replay).
+# Com 'store', só as empresas novas, desatualizadas ou incompletas são buscadas de novo.
+async def run_batch(entrada, saida, saida_jsonl=None, checkpoint=None, session=None, validar_cep=False, cep_url=VIACEP_URL,
+                    store=None, modo_cache='normal'):
+    if session is None:
+        async with ManagedSession() as session:
+            return await run_batch(entrada, saida, saida_jsonl, checkpoint, session, validar_cep, cep_url, store, modo_cache)
+
+    checkpoint = Checkpoint(checkpoint or f'{saida}.checkpoint')
+    resolver = CepResolver(session, base_url=cep_url, modo_cache=modo_cache) if validar_cep else None
+
+    with open(entrada, encoding='utf-8', newline='') as arquivo:
+        colunas = [coluna.strip() for coluna in next(csv.reader(arquivo, skipinitialspace=True), [])]
+    csv_sink = CsvSink(saida, colunas + COLUNAS_ENRIQUECIDAS)
+    jsonl_sink = JsonlSink(saida_jsonl) if saida_jsonl else None
+
+    tarefas = (
+        (chave, linha)
+        for chave, linha in ((chave_linha(numero, linha), linha) for numero, linha in ler_linhas(entrada))
+        if chave not in checkpoint
+    )
+
+    processadas, falhas = 0, 0
+    try:
+        with tqdm_asyncio(desc="Processando linhas") as progress_bar:
+            processar = partial(processar_linha, resolver=resolver, store=store)
+            rodada = 0
+            while True:
+                adiadas, espera = [], 0.0
+                async for item in iterar_queries(tarefas, session, progress_bar, processar=processar):
+                    if item['bloqueio'] is not None:
+                        adiadas.append(item['query'])
+                        espera = max(espera, item['bloqueio'].espera)
+                        continue
+
+                    chave, linha = item['query']
+                    fonte, resultado, cep, erro = item['result']
+                    if erro is not None:
+                        falhas += 1
+                        continue
+
+                    csv_sink.escrever(enriquecer(linha, fonte, resultado, cep))
+                    if jsonl_sink:
+                        jsonl_sink.escrever({'key': chave, 'row': linha, 'source': fonte, 'result': resultado.to_dict() if resultado else None,
+                                             'cep': {'cep': cep[0], 'valido': cep[1][0], 'dados': cep[1][1]} if cep else None})
+                    # O checkpoint só é gravado depois que a linha foi escrita na saída
+                    checkpoint.marcar(chave)
+                    processadas += 1
+
+                if not adiadas:
+                    break
+                if rodada >= RODADAS_BLOQUEIO:
+                    print(f"{len(adiadas)} linhas continuam bloqueadas e ficam para a próxima execução")
+                    break
+                rodada += 1
+                print(f"{len(adiadas)} linhas bloqueadas pela busca; nova tentativa em {espera:.0f} s")
+                await asyncio.sleep(espera)
+                tarefas = adiadas
+    finally:
+        csv_sink.close()
+        checkpoint.close()
+        if jsonl_sink:
+            jsonl_sink.close()
+
+    if falhas:
+        print(f"{falhas} linhas falharam na busca e ficam para a próxima execução")
+
+    return processadas
+
+def main():
+    parser = argparse.ArgumentParser(description="Enriquece um CSV de empresas com os contatos encontrados")
+    parser.add_argument('entrada', help="CSV de entrada (colunas Título, Telefone, Endereço, WebSite)")
+    parser.add_argument('saida', help="CSV de saída com as colunas enriquecidas")
+    parser.add_argument('--jsonl', help="Também grava os resultados completos em JSONL")
+    parser.add_argument('--checkpoint', help="Arquivo de checkpoint (padrão: <saida>.checkpoint)")
+    parser.add_argument('--validar-cep', action='store_true', help="Valida os CEPs dos endereços no ViaCEP")
+    parser.add_argument('--cep-url', default=VIACEP_URL, help="URL base do serviço de CEP (ex.: um servidor local de testes)")
+    parser.add_argument('--cache', choices=['normal', 'refresh', 'replay', 'off'], default='normal', help="Modo do cache de respostas")
+    parser.add_argument('--metricas', help="Grava as métricas por etapa ao final (JSON, ou formato Prometheus se terminar em .prom)")
+    parser.add_argument('--tentativas', type=int, default=TENTATIVAS, help="Tentativas por requisição em erros transitórios")
+    parser.add_argument('--hedge-apos', type=float, default=HEDGE_APOS, help="Segundos até repetir em paralelo uma requisição lenta")
+    parser.add_argument('--orcamento', type=float, default=ORCAMENTO_QUERY, help="Tempo máximo por linha, em segundos")
+    parser.add_argument('--max-bytes', type=int, default=MAX_BYTES_RESPOSTA, help="Bytes lidos de cada página (0 = sem limite)")
+    parser.add_argument('--store', help="Banco SQLite com os dados já encontrados; só empresas novas, desatualizadas ou incompletas são buscadas")
+    parser.add_argument('--max-idade', type=float, default=MAX_IDADE / 86400, help="Dias até os dados do store serem buscados de novo")
+    args = parser.parse_args()
+
+    configurar_cache(modo=args.cache)
+    configurar_fetch(max_bytes=args.max_bytes)
+    configurar_retentativas(tentativas=args.tentativas, hedge_apos=args.hedge_apos, orcamento=args.orcamento)
+    metricas = configurar_metricas()
+    controle_taxa = configurar_controle_taxa()
+    store = EnrichmentStore(args.store, max_idade=args.max_idade * 86400) if args.store else None
+    try:
+        processadas = asyncio.run(run_batch(args.entrada, args.saida, args.jsonl, args.checkpoint,
+                                            validar_cep=args.validar_cep, cep_url=args.cep_url, store=store,
+                                            modo_cache=args.cache))
+    finally:
+        if store is not None:
+            print(f"Store: {store.estatisticas()}")
+            store.close()
+    print(f"{processadas} linhas processadas")
+    print(f"Controle de taxa: {controle_taxa.estatisticas()}")
+    if args.metricas:
+        metricas.salvar(args.metricas)
+
+if __name__ == "__main__":
+    main()
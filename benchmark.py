@@ -0,0 +1,303 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import multiprocessing
+import random
+import resource
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from aiohttp import web
+
+# Parâmetros padrão do servidor simulado
+PORTA = 8765
+HOSTS_SITES = 8            # Endereços de loopback usados pelos sites (127.0.0.2, 127.0.0.3, ...)
+RESULTADOS_POR_BUSCA = 5
+LATENCIA_MS = 50           # Latência média de cada resposta dos sites
+VARIACAO_MS = 25           # Variação aleatória em torno da latência média
+TAMANHO_KB = 60            # Tamanho aproximado de cada página dos sites
+TAXA_FALHA = 0.05          # Fração das respostas dos sites que voltam com erro 500
+TAXA_SEM_CONTATO = 0.3     # Fração dos sites sem contato na página principal (força a varredura profunda)
+QUANTIDADE_QUERIES = 50
+
+MOTORES = ('beautifulsoup', 'selenium')
+
+CIDADES = ['Piracicaba', 'Belo Horizonte', 'Campinas', 'Curitiba', 'Recife', 'Porto Alegre']
+PARAGRAFO = '<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore.</p>\n'
+
+
+def _numero(texto):
+    return int(hashlib.sha1(texto.encode('utf-8')).hexdigest()[:8], 16)
+
+def gerar_queries(quantidade=QUANTIDADE_QUERIES):
+    return [f'Empresa {i} {CIDADES[i % len(CIDADES)]}' for i in range(quantidade)]
+
+
+# Servidor HTTP local que faz o papel do Google e dos sites das empresas.
+# Roda em uma thread com seu próprio event loop, então atende tanto o motor
+# assíncrono quanto os navegadores do Selenium.
+class ServidorSimulado:
+    def __init__(self, porta=PORTA, hosts_sites=HOSTS_SITES, resultados=RESULTADOS_POR_BUSCA,
+                 latencia_ms=LATENCIA_MS, variacao_ms=VARIACAO_MS, tamanho_kb=TAMANHO_KB,
+                 taxa_falha=TAXA_FALHA, taxa_sem_contato=TAXA_SEM_CONTATO, semente=0):
+        self.porta = porta
+        self.hosts = ['127.0.0.1'] + [f'127.0.0.{i + 2}' for i in range(hosts_sites)]
+        self.resultados = resultados
+        self.latencia_ms = latencia_ms
+        self.variacao_ms = variacao_ms
+        self.tamanho_kb = tamanho_kb
+        self.taxa_falha = taxa_falha
+        self.taxa_sem_contato = taxa_sem_contato
+        self.requisicoes = 0
+        self.falhas = 0
+        self._random = random.Random(semente)
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._pronto = threading.Event()
+
+    @property
+    def url_base(self):
+        return f'http://127.0.0.1:{self.porta}'
+
+    def _host_do_site(self, site):
+        sites = self.hosts[1:] or self.hosts
+        return sites[_numero(site) % len(sites)]
+
+    def _url_do_site(self, site):
+        return f'http://{self._host_do_site(site)}:{self.porta}/site/{site}/'
+
+    async def _pagina_inicial(self, request):
+        return web.Response(content_type='text/html', text=(
+            '<html><body><div id="search"><form action="/search" method="get">'
+            '<input name="q" type="text"><button type="submit">Buscar</button>'
+            '</form></div></body></html>'))
+
+    async def _busca(self, request):
+        query = request.query.get('q', '')
+        numero = _numero(query)
+        blocos = ''.join(
+            f'<div class="g"><a href="{self._url_do_site(f"{numero:x}-{i}")}"><h3>{query} - resultado {i}</h3></a>'
+            f'<div><span class="aCOpRe">Contato e endereço de {query}.</span></div></div>'
+            for i in range(self.resultados)
+        )
+        knowledge_graph = (
+            f'<div data-attrid="title">{query}</div>'
+            f'<span class="Aq14fc">{3 + numero % 20 / 10:.1f}</span><span class="hqzQac">{numero % 900} avaliações</span>'
+            f'<div data-attrid="kc:/location/location:address">Rua {numero % 300}, 100 - Centro, {query.split(" ", 2)[-1]} - SP, 13416-320</div>'
+            f'<div data-attrid="kc:/collection/knowledge_panels/has_phone:phone"><span>(19) 3436-{numero % 10000:04d}</span></div>'
+        )
+        scripts = '<script>var dados = "' + 'x' * 20000 + '";</script>'
+        return web.Response(content_type='text/html', text=(
+            f'<html><head>{scripts}</head><body><div id="rso">{knowledge_graph}<div id="search">{blocos}</div></div></body></html>'))
+
+    async def _site(self, request):
+        self.requisicoes += 1
+        atraso = max(0.0, self.latencia_ms + self._random.uniform(-self.variacao_ms, self.variacao_ms)) / 1000
+        await asyncio.sleep(atraso)
+        if self._random.random() < self.taxa_falha:
+            self.falhas += 1
+            return web.Response(status=500, text='erro')
+
+        site = request.match_info['site']
+        subpagina = request.match_info.get('subpagina', '')
+        numero = _numero(site)
+        sem_contato = (numero % 1000) / 1000 < self.taxa_sem_contato
+        contato = ''
+        if subpagina == 'contato' or (not subpagina and not sem_contato):
+            contato = (f'<p>E-mail: contato@empresa{numero % 1000}.com.br</p>'
+                       f'<p>Telefone: (19) 3436-{numero % 10000:04d}</p>'
+                       f'<p>Rua das Flores, {numero % 500} - Centro, Piracicaba - SP, 13416-320</p>'
+                       f'<a href="https://www.instagram.com/empresa{numero % 1000}">Instagram</a>')
+        elif subpagina:
+            return web.Response(status=404, text='não encontrado')
+
+        preenchimento = PARAGRAFO * max(1, self.tamanho_kb * 1024 // len(PARAGRAFO))
+        return web.Response(content_type='text/html', text=(
+            f'<html><body><h1>Empresa {site}</h1><a href="contato">Fale conosco</a>{preenchimento}{contato}</body></html>'))
+
+    async def _iniciar(self):
+        app = web.Application()
+        app.router.add_get('/', self._pagina_inicial)
+        app.router.add_get('/search', self._busca)
+        app.router.add_get('/site/{site}/', self._site)
+        app.router.add_get('/site/{site}/{subpagina}', self._site)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        for host in self.hosts:
+            await web.TCPSite(self._runner, host, self.porta).start()
+
+    def _rodar(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._iniciar())
+        self._pronto.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+        self._loop.close()
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._rodar, name='servidor-simulado', daemon=True)
+        self._thread.start()
+        self._pronto.wait()
+        return self
+
+    def parar(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+
+# Percentil pelo método do posto mais próximo
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    posicao = max(0, min(len(ordenados) - 1, math.ceil(p / 100 * len(ordenados)) - 1))
+    return ordenados[posicao]
+
+def _uso_de_recursos():
+    proprio = resource.getrusage(resource.RUSAGE_SELF)
+    filhos = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return proprio.ru_utime + proprio.ru_stime + filhos.ru_utime + filhos.ru_stime
+
+def _pico_rss_mb():
+    # No Linux ru_maxrss vem em KB
+    proprio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    filhos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(proprio, filhos) / 1024, 1)
+
+def _tem_contato_bs(resultado):
+    info = resultado.contact_info if resultado else None
+    return bool(info and (info.email or info.phone))
+
+def _medir_beautifulsoup(queries, url_base, parser):
+    import WebScrapBeautifulSoup as W
+
+    W.GOOGLE_SEARCH_URL = f'{url_base}/search'
+    W.configurar_parser(parser)
+
+    async def rodar():
+        latencias, com_contato = [], 0
+        async for item in W.iterar_queries(queries):
+            latencias.append(item['elapsed'])
+            com_contato += _tem_contato_bs(item['result'])
+        return latencias, com_contato
+
+    try:
+        return asyncio.run(rodar())
+    finally:
+        # Espera os processos de parsing terminarem para que entrem na conta de CPU
+        W.PARSER_POOL.close(wait=True)
+
+def _medir_selenium(queries, url_base, workers):
+    import WebScrapSelenium as S
+    from driver_pool import DriverPool
+
+    S.GOOGLE_URL = f'{url_base}/'
+    latencias, com_contato = [], 0
+    S.resolver_chromedriver()
+    with DriverPool(S.configure_driver, tamanho=workers) as pool:
+        pool.aquecer()
+
+        def rodar(query):
+            inicio = time.perf_counter()
+            resultado = S.run_scraping(query, pool)
+            latencias.append(time.perf_counter() - inicio)
+            return resultado
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            resultados = list(executor.map(rodar, queries))
+    com_contato = sum(1 for resultado in resultados if resultado.email or resultado.phone)
+    return latencias, com_contato
+
+# Roda um motor em um processo próprio, para que CPU e pico de memória sejam só dele
+def executar_motor(motor, queries, url_base, parser='process', workers=4):
+    cpu_inicio = _uso_de_recursos()
+    inicio = time.perf_counter()
+    if motor == 'beautifulsoup':
+        latencias, com_contato = _medir_beautifulsoup(queries, url_base, parser)
+    elif motor == 'selenium':
+        latencias, com_contato = _medir_selenium(queries, url_base, workers)
+    else:
+        raise ValueError(f"Motor desconhecido: {motor}")
+    total = time.perf_counter() - inicio
+
+    return {
+        'motor': motor,
+        'queries': len(queries),
+        'com_contato': com_contato,
+        'tempo_total': round(total, 3),
+        'queries_por_segundo': round(len(queries) / total, 2) if total else 0.0,
+        'p50': round(percentil(latencias, 50), 3),
+        'p95': round(percentil(latencias, 95), 3),
+        'p99': round(percentil(latencias, 99), 3),
+        'cpu_segundos': round(_uso_de_recursos() - cpu_inicio, 2),
+        'pico_rss_mb': _pico_rss_mb()
+    }
+
+def rodar_benchmark(motores=MOTORES, queries=None, parser='process', workers=4, **opcoes_servidor):
+    queries = queries or gerar_queries()
+    relatorios = []
+    with ServidorSimulado(**opcoes_servidor) as servidor:
+        for motor in motores:
+            requisicoes, falhas = servidor.requisicoes, servidor.falhas
+            contexto = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as executor:
+                try:
+                    relatorio = executor.submit(executar_motor, motor, queries, servidor.url_base, parser, workers).result()
+                except Exception as e:
+                    relatorio = {'motor': motor, 'erro': str(e)}
+            relatorio['servidor'] = {'requisicoes': servidor.requisicoes - requisicoes, 'falhas': servidor.falhas - falhas}
+            relatorios.append(relatorio)
+    return relatorios
+
+def imprimir_relatorios(relatorios):
+    colunas = ['queries', 'com_contato', 'tempo_total', 'queries_por_segundo', 'p50', 'p95', 'p99', 'cpu_segundos', 'pico_rss_mb']
+    print(f"{'motor':<15}" + ''.join(f'{coluna:>20}' for coluna in colunas))
+    for relatorio in relatorios:
+        if 'erro' in relatorio:
+            print(f"{relatorio['motor']:<15}erro: {relatorio['erro']}")
+            continue
+        print(f"{relatorio['motor']:<15}" + ''.join(f'{relatorio[coluna]:>20}' for coluna in colunas))
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede a vazão dos motores de scraping contra um servidor local que simula o Google e os sites")
+    parser.add_argument('--motores', nargs='+', choices=MOTORES, default=list(MOTORES))
+    parser.add_argument('--queries', type=int, default=QUANTIDADE_QUERIES, help="Quantidade de queries geradas")
+    parser.add_argument('--porta', type=int, default=PORTA)
+    parser.add_argument('--hosts', type=int, default=HOSTS_SITES, help="Endereços de loopback usados pelos sites (Linux)")
+    parser.add_argument('--resultados', type=int, default=RESULTADOS_POR_BUSCA, help="Resultados por página de busca")
+    parser.add_argument('--latencia', type=float, default=LATENCIA_MS, help="Latência média dos sites em ms")
+    parser.add_argument('--variacao', type=float, default=VARIACAO_MS, help="Variação da latência em ms")
+    parser.add_argument('--tamanho', type=int, default=TAMANHO_KB, help="Tamanho das páginas dos sites em KB")
+    parser.add_argument('--taxa-falha', type=float, default=TAXA_FALHA, help="Fração das respostas com erro 500")
+    parser.add_argument('--taxa-sem-contato', type=float, default=TAXA_SEM_CONTATO, help="Fração dos sites sem contato na página principal")
+    parser.add_argument('--parser', choices=['process', 'thread', 'inline'], default='process', help="Modo do pool de parsing do BeautifulSoup")
+    parser.add_argument('--workers', type=int, default=4, help="Navegadores do Selenium")
+    parser.add_argument('--json', help="Grava os relatórios em um arquivo JSON")
+    args = parser.parse_args()
+
+    relatorios = rodar_benchmark(
+        args.motores, gerar_queries(args.queries), parser=args.parser, workers=args.workers,
+        porta=args.porta, hosts_sites=args.hosts, resultados=args.resultados,
+        latencia_ms=args.latencia, variacao_ms=args.variacao, tamanho_kb=args.tamanho,
+        taxa_falha=args.taxa_falha, taxa_sem_contato=args.taxa_sem_contato
+    )
+    imprimir_relatorios(relatorios)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorios, arquivo, indent=4, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Modos de operação do cache:
+#  - 'normal': lê do cache e grava respostas novas
+#  - 'refresh': ignora o que está no cache, mas grava as respostas novas
+#  - 'replay': usa apenas o cache (nenhuma requisição de rede é feita)
+#  - 'off': cache desligado
+MODOS_CACHE = ('normal', 'refresh', 'replay', 'off')
+
+# Cabeçalhos que alteram o conteúdo da resposta e por isso entram na chave.
+# O User-Agent é sorteado a cada requisição e não faz parte da chave.
+CABECALHOS_RELEVANTES = ('accept-language', 'accept')
+
+# Parâmetros de rastreamento que não mudam o conteúdo da página
+PARAMETROS_IGNORADOS = ('utm_source', 'utm_medium', 'utm_campaign', 'utm_content', 'utm_term', 'gclid', 'fbclid')
+
+
+# Levantada no modo 'replay' quando a resposta não está no cache
+class CacheMiss(Exception):
+    pass
+
+
+# Função para normalizar uma URL antes de usá-la como chave
+def normalizar_url(url):
+    partes = urlsplit(url.strip())
+    esquema = partes.scheme.lower()
+    host = (partes.hostname or '').lower()
+    if partes.port and not ((esquema == 'http' and partes.port == 80) or (esquema == 'https' and partes.port == 443)):
+        host = f'{host}:{partes.port}'
+    caminho = partes.path or '/'
+    parametros = sorted(
+        (chave, valor) for chave, valor in parse_qsl(partes.query, keep_blank_values=True)
+        if chave.lower() not in PARAMETROS_IGNORADOS
+    )
+    return urlunsplit((esquema, host, caminho, urlencode(parametros), ''))
+
+
+class ResponseCache:
+    def __init__(self, diretorio='.cache/http', ttl=24 * 60 * 60, max_bytes=512 * 1024 * 1024, modo='normal'):
+        if modo not in MODOS_CACHE:
+            raise ValueError(f"Modo de cache inválido: {modo}")
+        self.diretorio = diretorio
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.modo = modo
+        self.hits = 0
+        self.misses = 0
+        self._tamanho_total = None
+
+    # Gera a chave de conteúdo a partir da URL normalizada e dos cabeçalhos relevantes.
+    # 'variante' separa outras versões da mesma página (ex.: 'navegador', a página renderizada).
+    def chave(self, url, headers=None, variante=None):
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        partes = [normalizar_url(url)]
+        for nome in CABECALHOS_RELEVANTES:
+            if nome in headers:
+                partes.append(f'{nome}:{headers[nome]}')
+        if variante:
+            partes.append(f'variante:{variante}')
+        return hashlib.sha256('\n'.join(partes).encode('utf-8')).hexdigest()
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, chave[:2], f'{chave}.json.gz')
+
+    @property
+    def leitura(self):
+        return self.modo in ('normal', 'replay')
+
+    @property
+    def escrita(self):
+        return self.modo in ('normal', 'refresh')
+
+    # Retorna (status, texto) se houver uma entrada válida, ou None
+    def get(self, url, headers=None, variante=None):
+        if not self.leitura:
+            return None
+
+        caminho = self._caminho(self.chave(url, headers, variante))
+        try:
+            with gzip.open(caminho, 'rt', encoding='utf-8') as arquivo:
+                entrada = json.load(arquivo)
+        except (OSError, ValueError):
+            entrada = None
+
+        # No modo replay a entrada é usada mesmo depois de expirada
+        if entrada and (self.modo == 'replay' or time.time() - entrada['criado_em'] <= self.ttl):
+            self.hits += 1
+            try:
+                os.utime(caminho)  # Marca o uso recente para a política de remoção
+            except OSError:
+                pass
+            return entrada['status'], entrada['texto']
+
+        self.misses += 1
+        if self.modo == 'replay':
+            raise CacheMiss(f"Resposta não está no cache: {url}")
+        return None
+
+    def set(self, url, status, texto, headers=None, variante=None):
+        if not self.escrita:
+            return
+
+        caminho = self._caminho(self.chave(url, headers, variante))
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        entrada = {
+            'url': normalizar_url(url),
+            'status': status,
+            'criado_em': time.time(),
+            'texto': texto
+        }
+        temporario = f'{caminho}.{os.getpid()}.tmp'
+        with gzip.open(temporario, 'wt', encoding='utf-8') as arquivo:
+            json.dump(entrada, arquivo, ensure_ascii=False)
+        os.replace(temporario, caminho)
+
+        if self._tamanho_total is not None:
+            self._tamanho_total += os.path.getsize(caminho)
+        self.evict()
+
+    def _entradas(self):
+        if not os.path.isdir(self.diretorio):
+            return
+        for raiz, _, arquivos in os.walk(self.diretorio):
+            for nome in arquivos:
+                if nome.endswith('.json.gz'):
+                    caminho = os.path.join(raiz, nome)
+                    try:
+                        info = os.stat(caminho)
+                    except OSError:
+                        continue
+                    yield caminho, info.st_size, info.st_mtime
+
+    # Remove as entradas expiradas e, se o cache passar do limite, as menos usadas
+    def evict(self):
+        if self._tamanho_total is not None and self._tamanho_total <= self.max_bytes:
+            return
+
+        agora = time.time()
+        entradas = []
+        total = 0
+        for caminho, tamanho, modificado in self._entradas():
+            if self.modo != 'replay' and agora - modificado > self.ttl:
+                try:
+                    os.remove(caminho)
+                except OSError:
+                    pass
+                continue
+            entradas.append((modificado, tamanho, caminho))
+            total += tamanho
+
+        entradas.sort()
+        while total > self.max_bytes and entradas:
+            _, tamanho, caminho = entradas.pop(0)
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+            total -= tamanho
+
+        self._tamanho_total = total
+
+    def limpar(self):
+        for caminho, _, _ in list(self._entradas()):
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+        self._tamanho_total = 0
@@ -0,0 +1,39 @@
+import re
+import unicodedata
+
+# Sufixos societários ignorados no fim do nome ("Ltda", "ME", "S/A"...). Só no fim:
+# no começo ou no meio eles fazem parte do nome ("Cia Hering", "Me Salva").
+SUFIXOS_EMPRESA = ('ltda', 'me', 'epp', 'eireli', 'sa', 'cia', 'mei')
+
+PADRAO_NAO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+
+# Forma canônica de uma query ou nome de empresa, usada para reconhecer equivalentes:
+# "Padaria São João Ltda." e "padaria  sao joao" -> "padaria sao joao"
+def canonicalizar_query(query):
+    texto = unicodedata.normalize('NFKD', query or '')
+    texto = ''.join(caractere for caractere in texto if not unicodedata.combining(caractere)).lower()
+    palavras = PADRAO_NAO_ALFANUMERICO.sub(' ', texto).split()
+    # Se a query for só o sufixo, ele fica
+    while len(palavras) > 1:
+        if palavras[-1] in SUFIXOS_EMPRESA:
+            palavras.pop()
+        elif len(palavras) > 2 and palavras[-2:] == ['s', 'a']:  # "S/A" e "S.A." viram "s a"
+            del palavras[-2:]
+        else:
+            break
+    return ' '.join(palavras)
+
+# Agrupa as queries equivalentes. Retorna as representantes (a primeira grafia de cada grupo,
+# que é a usada na busca) e, para cada query original, o índice do seu grupo.
+def agrupar_queries(queries):
+    representantes = []
+    grupos = []
+    indices = {}
+    for query in queries:
+        chave = canonicalizar_query(query) or query
+        if chave not in indices:
+            indices[chave] = len(representantes)
+            representantes.append(query)
+        grupos.append(indices[chave])
+    return representantes, grupos
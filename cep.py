@@ -0,0 +1,103 @@
+import asyncio
+import json
+import re
+
+import aiohttp
+
+from cache import CacheMiss, ResponseCache
+from singleflight import SingleFlight
+
+# Endereço do ViaCEP; pode ser trocado por um servidor local nos testes
+VIACEP_URL = 'https://viacep.com.br/ws'
+TIMEOUT_CEP = 10
+# CEPs quase nunca mudam, então o cache dura bastante
+TTL_CEP = 90 * 24 * 60 * 60
+
+PADRAO_CEP = re.compile(r'(?<!\d)(\d{5})-?(\d{3})(?!\d)')
+
+# Resposta de um CEP que não existe; as demais falhas (rede, cache) não dizem nada sobre o CEP
+CEP_NAO_ENCONTRADO = "CEP não encontrado"
+
+
+# Retorna o CEP só com os 8 dígitos, ou None se não for um CEP
+def normalizar_cep(cep):
+    digitos = re.sub(r'\D', '', cep or '')
+    return digitos if len(digitos) == 8 else None
+
+# Encontra os CEPs em um texto (ex.: "Piracicaba - SP, 13416-320")
+def extrair_ceps(texto):
+    ceps = []
+    for match in PADRAO_CEP.finditer(texto or ''):
+        cep = match.group(1) + match.group(2)
+        if cep not in ceps:
+            ceps.append(cep)
+    return ceps
+
+
+# O resultado da consulta vale para o CEP: encontrado ou inexistente (não um erro de rede ou de cache)
+def resultado_definitivo(resultado):
+    ok, dados = resultado
+    return ok or dados == CEP_NAO_ENCONTRADO
+
+
+# Consulta de CEPs assíncrona, com cache em disco e requisições agrupadas:
+# o mesmo CEP pedido várias vezes ao mesmo tempo gera uma única consulta.
+# No modo de cache 'replay' nenhuma consulta sai para a rede.
+class CepResolver:
+    def __init__(self, session, base_url=VIACEP_URL, cache=None, timeout=TIMEOUT_CEP, modo_cache='normal'):
+        self.session = session
+        self.base_url = base_url.rstrip('/')
+        self.cache = cache if cache is not None else ResponseCache('.cache/cep', ttl=TTL_CEP, modo=modo_cache)
+        self.timeout = timeout
+        # Erros de consulta não ficam guardados: o mesmo CEP é consultado de novo na próxima linha
+        self._singleflight = SingleFlight(memorizavel=resultado_definitivo)
+
+    # Retorna (True, dados) ou (False, mensagem), como consultar_cep
+    async def consultar(self, cep):
+        cep_normalizado = normalizar_cep(cep)
+        if not cep_normalizado:
+            return False, "CEP inválido"
+        return await self._singleflight.do(cep_normalizado, lambda: self._buscar(cep_normalizado))
+
+    async def _buscar(self, cep):
+        url = f'{self.base_url}/{cep}/json/'
+        try:
+            cached = self.cache.get(url)
+            if cached is not None:
+                status, texto = cached
+            else:
+                async with self.session.get(url, timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
+                    status, texto = response.status, await response.text()
+                if status == 200:
+                    self.cache.set(url, status, texto)
+        except CacheMiss:
+            return False, "CEP não está no cache"
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False, "Erro ao consultar CEP"
+
+        if status != 200:
+            return False, "Erro ao consultar CEP"
+        try:
+            dados = json.loads(texto)
+        except ValueError:
+            return False, "Erro ao consultar CEP"
+        if 'erro' in dados:
+            return False, CEP_NAO_ENCONTRADO
+        return True, dados
+
+    # Consulta vários CEPs de uma vez; retorna {cep: (ok, dados ou mensagem)}
+    async def validar_lote(self, ceps):
+        unicos = []
+        for cep in ceps:
+            cep_normalizado = normalizar_cep(cep)
+            if cep_normalizado and cep_normalizado not in unicos:
+                unicos.append(cep_normalizado)
+        resultados = await asyncio.gather(*(self.consultar(cep) for cep in unicos))
+        return dict(zip(unicos, resultados))
+
+    # Extrai e valida todos os CEPs de uma lista de endereços
+    async def validar_enderecos(self, enderecos):
+        ceps = []
+        for endereco in enderecos:
+            ceps.extend(extrair_ceps(endereco))
+        return await self.validar_lote(ceps)
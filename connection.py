@@ -0,0 +1,127 @@
+import asyncio
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import aiohttp
+
+# Limites padrão da camada de conexões
+LIMITE_GLOBAL = 100         # Conexões simultâneas no total
+LIMITE_POR_HOST = 6         # Conexões simultâneas para um mesmo host
+KEEPALIVE_TIMEOUT = 30      # Segundos que uma conexão ociosa fica aberta para reuso
+TTL_DNS_CACHE = 300         # Segundos que uma resolução de DNS fica em cache
+
+
+# Estatísticas de uso das conexões
+class ConnectionStats:
+    def __init__(self):
+        self.requisicoes = 0
+        self.conexoes_criadas = 0
+        self.conexoes_reusadas = 0
+        self.dns_hits = 0
+        self.dns_misses = 0
+        self.espera_total = 0.0  # Tempo total aguardando uma vaga nos limites
+        self.por_host = Counter()
+
+    def to_dict(self):
+        total = self.conexoes_criadas + self.conexoes_reusadas
+        return {
+            'requisicoes': self.requisicoes,
+            'conexoes_criadas': self.conexoes_criadas,
+            'conexoes_reusadas': self.conexoes_reusadas,
+            'taxa_reuso': round(self.conexoes_reusadas / total, 3) if total else 0.0,
+            'dns_hits': self.dns_hits,
+            'dns_misses': self.dns_misses,
+            'espera_total': round(self.espera_total, 3),
+            'por_host': dict(self.por_host.most_common(20))
+        }
+
+
+# Sessão HTTP compartilhada com limites globais e por host.
+# Tem a mesma interface de session.get() do aiohttp, então pode ser passada
+# diretamente para google_search, scrape_contact_info e buscar_info_em_posts.
+class ManagedSession:
+    def __init__(self, limite_global=LIMITE_GLOBAL, limite_por_host=LIMITE_POR_HOST,
+                 keepalive_timeout=KEEPALIVE_TIMEOUT, ttl_dns_cache=TTL_DNS_CACHE):
+        self.limite_global = limite_global
+        self.limite_por_host = limite_por_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.stats = ConnectionStats()
+        self._session = None
+        self._semaforo_global = None
+        self._semaforos_host = {}
+
+    def _trace_config(self):
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            self.stats.requisicoes += 1
+            self.stats.por_host[params.url.host] += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            self.stats.conexoes_criadas += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self.stats.conexoes_reusadas += 1
+
+        async def on_dns_cache_hit(session, ctx, params):
+            self.stats.dns_hits += 1
+
+        async def on_dns_cache_miss(session, ctx, params):
+            self.stats.dns_misses += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.limite_global,
+            limit_per_host=self.limite_por_host,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self.ttl_dns_cache
+        )
+        self._session = aiohttp.ClientSession(connector=connector, trace_configs=[self._trace_config()])
+        self._semaforo_global = asyncio.Semaphore(self.limite_global)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def closed(self):
+        return self._session is None or self._session.closed
+
+    def _semaforo_host(self, host):
+        semaforo = self._semaforos_host.get(host)
+        if semaforo is None:
+            semaforo = asyncio.Semaphore(self.limite_por_host)
+            self._semaforos_host[host] = semaforo
+        return semaforo
+
+    # A vaga é reservada antes de chamar o aiohttp, assim o timeout da
+    # requisição não conta o tempo de espera na fila do pool de conexões.
+    # A vaga do host vem antes da global: quem espera um host ocupado não
+    # segura uma vaga global que outros hosts poderiam usar.
+    @asynccontextmanager
+    async def get(self, url, **kwargs):
+        host = urlsplit(url).hostname or ''
+        inicio = time.monotonic()
+        async with self._semaforo_host(host), self._semaforo_global:
+            self.stats.espera_total += time.monotonic() - inicio
+            async with self._session.get(url, **kwargs) as response:
+                yield response
+
+    def estatisticas(self):
+        return self.stats.to_dict()
@@ -0,0 +1,141 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Número padrão de navegadores mantidos abertos
+TAMANHO_POOL = 4
+# Depois de quantas páginas um navegador é reciclado (evita vazamento de memória do Chrome)
+MAX_PAGINAS_POR_DRIVER = 50
+
+
+# Envolve um WebDriver contando as páginas carregadas por ele.
+# Todo o resto é repassado para o driver original.
+class PooledDriver:
+    def __init__(self, driver):
+        self.driver = driver
+        self.paginas = 0
+
+    def get(self, url):
+        self.paginas += 1
+        return self.driver.get(url)
+
+    def __getattr__(self, nome):
+        return getattr(self.driver, nome)
+
+
+# Pool de navegadores headless reaproveitados entre as queries
+class DriverPool:
+    def __init__(self, fabrica, tamanho=TAMANHO_POOL, max_paginas=MAX_PAGINAS_POR_DRIVER):
+        self.fabrica = fabrica
+        self.tamanho = tamanho
+        self.max_paginas = max_paginas
+        self.reciclados = 0
+        self._livres = queue.Queue()
+        self._lock = threading.Lock()
+        self._criados = 0
+        self._fechado = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Abre todos os navegadores de uma vez, em paralelo, antes do primeiro uso
+    def aquecer(self):
+        with self._lock:
+            faltando = self.tamanho - self._criados
+            self._criados += faltando
+        with ThreadPoolExecutor(max_workers=max(faltando, 1)) as executor:
+            futuros = [executor.submit(self._criar) for _ in range(faltando)]
+
+        criados, erro = [], None
+        for futuro in futuros:
+            try:
+                criados.append(futuro.result())
+            except Exception as e:
+                erro = erro or e
+        if erro is not None:
+            # Uma falha no meio do aquecimento não pode deixar navegadores abertos
+            for driver in criados:
+                try:
+                    driver.driver.quit()
+                except Exception:
+                    pass
+            with self._lock:
+                self._criados -= len(criados)
+            raise erro
+
+        for driver in criados:
+            self._livres.put(driver)
+
+    def _criar(self):
+        try:
+            return PooledDriver(self.fabrica())
+        except Exception:
+            with self._lock:
+                self._criados -= 1
+            raise
+
+    def _descartar(self, driver):
+        try:
+            driver.driver.quit()
+        except Exception:
+            pass
+        with self._lock:
+            self._criados -= 1
+        self.reciclados += 1
+
+    # Verifica se o navegador ainda responde
+    def _saudavel(self, driver):
+        try:
+            driver.driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def _obter(self, timeout=None):
+        while True:
+            try:
+                driver = self._livres.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    pode_criar = self._criados < self.tamanho
+                    if pode_criar:
+                        self._criados += 1
+                if pode_criar:
+                    return self._criar()
+                driver = self._livres.get(timeout=timeout)
+
+            # Um driver descartado libera uma vaga; o None só acorda quem está esperando
+            if driver is None:
+                continue
+            if self._saudavel(driver):
+                return driver
+            self._descartar(driver)
+
+    def _devolver(self, driver):
+        if self._fechado or driver.paginas >= self.max_paginas:
+            self._descartar(driver)
+            self._livres.put(None)
+        else:
+            self._livres.put(driver)
+
+    @contextmanager
+    def acquire(self, timeout=None):
+        driver = self._obter(timeout)
+        try:
+            yield driver
+        finally:
+            self._devolver(driver)
+
+    def close(self):
+        self._fechado = True
+        while True:
+            try:
+                driver = self._livres.get_nowait()
+            except queue.Empty:
+                break
+            if driver is not None:
+                self._descartar(driver)
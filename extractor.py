@@ -0,0 +1,90 @@
+import re
+
+# Um único padrão com grupos nomeados: o texto é percorrido uma vez só e cada
+# trecho encontrado é classificado pelo grupo que casou. A ordem das
+# alternativas importa: URLs antes de e-mails, e-mails e CEPs antes de telefones.
+PADRAO_CONTATOS = re.compile(r'''
+    (?P<social>https?://(?:www\.)?(?:facebook|instagram|linkedin|twitter)\.com/[^\s'"<>]+)
+  | (?P<email>[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})
+  | (?P<cep>(?<!\d)\d{5}-\d{3}(?!\d))
+  | (?P<phone>(?<!\d)(?:
+        0[3589]00[\s.-]?\d{3}[\s.-]?\d{4}                           # 0800 123 4567
+      | [34]00\d[\s.-]\d{4}                                        # 4004-0001
+      | (?:\+?55[\s.-]?)?\(?0?\d{2}\)?[\s.-]?\d{4,5}[\s.-]?\d{4}     # (019) 3436-1234
+    )(?!\d))
+''', re.VERBOSE)
+
+# Regex para redes sociais (apenas perfil principal)
+PADROES_PERFIL = {
+    'facebook': re.compile(r'https://(?:www\.)?facebook\.com/([^/?\s\'"<>]+)(?:/.*)?'),
+    'linkedin': re.compile(r'https://(?:www\.)?linkedin\.com/(?:company/|in/)([^/?\s\'"<>]+)(?:/.*)?'),
+    'instagram': re.compile(r'https://(?:www\.)?instagram\.com/([^/?\s\'"<>]+)(?:/.*)?')
+}
+
+# Extensões que aparecem em nomes de arquivo parecidos com e-mails (ex.: logo@2x.png)
+EXTENSOES_ARQUIVO = ('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.js', '.css')
+
+# Um trecho antes do CEP é considerado endereço se tiver "logradouro, número"
+PADRAO_LOGRADOURO = re.compile(r'[^\W\d_][\w.\s]*,\s*\d+')
+MAX_TAMANHO_ENDERECO = 150
+
+
+def normalizar_social_media(url):
+    for site, pattern in PADROES_PERFIL.items():
+        match = pattern.search(url)
+        if match:
+            return f'https://{site}.com/{match.group(1)}'
+
+    return None
+
+# Recorta o trecho de texto que antecede um CEP (até o início da linha)
+def _endereco_antes_do_cep(texto, inicio, fim):
+    limite = max(0, inicio - MAX_TAMANHO_ENDERECO)
+    quebra = texto.rfind('\n', limite, inicio)
+    trecho = texto[(quebra + 1 if quebra != -1 else limite):fim]
+    trecho = ' '.join(trecho.split()).strip(' ,-')
+    if PADRAO_LOGRADOURO.search(trecho):
+        return trecho
+    return None
+
+def _adicionar(lista, vistos, valor):
+    if valor not in vistos:
+        vistos.add(valor)
+        lista.append(valor)
+
+# Extrai e-mails, telefones, CEPs, endereços e perfis sociais em uma única passada.
+# Os telefones são devolvidos como candidatos, sem validação.
+def extrair_contatos(texto):
+    emails, phones, ceps, addresses, social_links = [], [], [], [], []
+    vistos = set()
+
+    for match in PADRAO_CONTATOS.finditer(texto):
+        tipo = match.lastgroup
+        valor = match.group(tipo)
+        if tipo == 'email':
+            if not valor.lower().endswith(EXTENSOES_ARQUIVO):
+                _adicionar(emails, vistos, valor)
+        elif tipo == 'phone':
+            _adicionar(phones, vistos, valor.strip())
+        elif tipo == 'cep':
+            _adicionar(ceps, vistos, valor)
+            endereco = _endereco_antes_do_cep(texto, match.start(), match.end())
+            if endereco:
+                _adicionar(addresses, vistos, endereco)
+        else:
+            _adicionar(social_links, vistos, valor)
+
+    social_media_profiles = []
+    for link in social_links:
+        normalized_url = normalizar_social_media(link)
+        if normalized_url:
+            _adicionar(social_media_profiles, vistos, normalized_url)
+
+    return {
+        'emails': emails,
+        'phones': phones,
+        'ceps': ceps,
+        'addresses': addresses,
+        'social_links': social_links,
+        'social_media_profiles': social_media_profiles
+    }
@@ -0,0 +1,91 @@
+import codecs
+from collections import Counter
+
+# Limites padrão da leitura das respostas
+MAX_BYTES_RESPOSTA = 2 * 1024 * 1024   # Bytes lidos de cada corpo; o resto é descartado
+TAMANHO_BLOCO = 64 * 1024              # Tamanho de cada leitura do corpo
+# Tipos de conteúdo que valem a pena baixar; PDFs, imagens, vídeos etc. são ignorados
+TIPOS_PERMITIDOS = ('text/html', 'application/xhtml+xml', 'text/plain')
+
+
+# Estatísticas das respostas lidas
+class FetchStats:
+    def __init__(self):
+        self.lidas = 0
+        self.ignoradas = 0
+        self.truncadas = 0
+        self.bytes_lidos = 0
+        self.tipos_ignorados = Counter()
+
+    def to_dict(self):
+        return {
+            'lidas': self.lidas,
+            'ignoradas': self.ignoradas,
+            'truncadas': self.truncadas,
+            'bytes_lidos': self.bytes_lidos,
+            'tipos_ignorados': dict(self.tipos_ignorados.most_common(10))
+        }
+
+
+# Política de leitura do corpo das respostas: ignora conteúdos que não são HTML
+# (pelo cabeçalho, sem baixar o corpo) e lê o resto em blocos até o limite de bytes,
+# abandonando o download quando o limite é atingido
+class FetchPolicy:
+    def __init__(self, max_bytes=MAX_BYTES_RESPOSTA, tipos_permitidos=TIPOS_PERMITIDOS, tamanho_bloco=TAMANHO_BLOCO):
+        self.max_bytes = max_bytes
+        self.tipos_permitidos = tuple(tipos_permitidos)
+        self.tamanho_bloco = tamanho_bloco
+        self.stats = FetchStats()
+
+    # Respostas sem Content-Type são lidas (muitos servidores não informam o tipo)
+    def permitido(self, content_type):
+        tipo = (content_type or '').split(';')[0].strip().lower()
+        return not tipo or tipo in self.tipos_permitidos
+
+    # Lê o corpo de uma resposta do aiohttp; retorna o texto ('' se o tipo foi ignorado)
+    # e a quantidade de bytes lidos
+    async def ler(self, response):
+        content_type = response.headers.get('Content-Type', '')
+        if not self.permitido(content_type):
+            self.stats.ignoradas += 1
+            self.stats.tipos_ignorados[content_type.split(';')[0].strip().lower()] += 1
+            return '', 0
+
+        corpo = bytearray()
+        truncada = False
+        async for bloco in response.content.iter_chunked(self.tamanho_bloco):
+            corpo.extend(bloco)
+            if self.max_bytes and len(corpo) >= self.max_bytes:
+                del corpo[self.max_bytes:]
+                truncada = True
+                break
+
+        self.stats.lidas += 1
+        self.stats.bytes_lidos += len(corpo)
+        if truncada:
+            self.stats.truncadas += 1
+        return decodificar(bytes(corpo), response.charset), len(corpo)
+
+    # Aplica o limite de bytes a uma página obtida de outro jeito (ex.: renderizada no navegador)
+    def limitar(self, texto):
+        corpo = texto.encode('utf-8')
+        self.stats.lidas += 1
+        if self.max_bytes and len(corpo) > self.max_bytes:
+            self.stats.truncadas += 1
+            self.stats.bytes_lidos += self.max_bytes
+            return corpo[:self.max_bytes].decode('utf-8', errors='ignore')
+        self.stats.bytes_lidos += len(corpo)
+        return texto
+
+    def estatisticas(self):
+        return self.stats.to_dict()
+
+
+# Decodifica com o charset informado pelo servidor (ou UTF-8). Um corpo truncado
+# pode terminar no meio de um caractere, então bytes inválidos são substituídos.
+def decodificar(corpo, charset=None):
+    try:
+        codecs.lookup(charset or 'utf-8')
+    except LookupError:
+        charset = None
+    return corpo.decode(charset or 'utf-8', errors='replace')
@@ -0,0 +1,191 @@
+import asyncio
+import bisect
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import aiohttp
+
+# Limites (em segundos) dos intervalos dos histogramas de latência
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30)
+PREFIXO_PROMETHEUS = 'scraper'
+
+
+# Classifica uma exceção em uma categoria curta para a contagem de erros
+def categorizar(excecao):
+    if isinstance(excecao, (asyncio.TimeoutError, TimeoutError)) or 'Timeout' in type(excecao).__name__:
+        return 'timeout'
+    if isinstance(excecao, (aiohttp.ClientError, ConnectionError)):
+        return 'conexao'
+    return type(excecao).__name__
+
+
+# Histograma de latências com intervalos fixos
+class Histograma:
+    def __init__(self, buckets=BUCKETS_LATENCIA):
+        self.buckets = tuple(buckets)
+        self.contagens = [0] * (len(self.buckets) + 1)  # O último intervalo é o +Inf
+        self.total = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def observar(self, valor):
+        self.contagens[bisect.bisect_left(self.buckets, valor)] += 1
+        self.total += 1
+        self.soma += valor
+        self.maximo = max(self.maximo, valor)
+
+    # Estimativa do percentil: limite superior do intervalo onde ele cai
+    def percentil(self, p):
+        if not self.total:
+            return 0.0
+        alvo = p / 100 * self.total
+        acumulado = 0
+        for limite, contagem in zip(self.buckets, self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return min(limite, self.maximo)
+        return self.maximo
+
+    def to_dict(self):
+        return {
+            'total': self.total,
+            'soma': round(self.soma, 4),
+            'media': round(self.soma / self.total, 4) if self.total else 0.0,
+            'p50': round(self.percentil(50), 4),
+            'p95': round(self.percentil(95), 4),
+            'p99': round(self.percentil(99), 4),
+            'maximo': round(self.maximo, 4)
+        }
+
+
+# Tempos medidos dentro das funções de parsing. Essas funções podem rodar em outro
+# processo, então os tempos voltam junto com o resultado e são registrados no pai.
+class Cronometro:
+    def __init__(self):
+        self.tempos = {}
+
+    @contextmanager
+    def medir(self, etapa):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tempos[etapa] = self.tempos.get(etapa, 0.0) + time.perf_counter() - inicio
+
+
+# Métricas por etapa: histogramas de latência, erros por categoria e bytes baixados.
+# Pode ser usada a partir do event loop e das threads do Selenium.
+class Metricas:
+    def __init__(self, buckets=BUCKETS_LATENCIA):
+        self.buckets = buckets
+        self.latencias = {}
+        self.erros = Counter()
+        self.bytes = Counter()
+        self.observadores = []
+        self._lock = threading.Lock()
+
+    # Observadores recebem (etapa, duração, categoria do erro ou None) a cada medição
+    def adicionar_observador(self, observador):
+        self.observadores.append(observador)
+
+    def observar(self, etapa, duracao, erro=None):
+        with self._lock:
+            if etapa not in self.latencias:
+                self.latencias[etapa] = Histograma(self.buckets)
+            self.latencias[etapa].observar(duracao)
+            if erro:
+                self.erros[(etapa, erro)] += 1
+        for observador in self.observadores:
+            observador(etapa, duracao, erro)
+
+    # Mede o bloco; exceções são contadas pela categoria e propagadas normalmente.
+    # Tarefas canceladas não entram na conta.
+    @contextmanager
+    def medir(self, etapa):
+        inicio = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.observar(etapa, time.perf_counter() - inicio, categorizar(e))
+            raise
+        else:
+            self.observar(etapa, time.perf_counter() - inicio)
+
+    def registrar_erro(self, etapa, categoria):
+        with self._lock:
+            self.erros[(etapa, categoria)] += 1
+
+    def registrar_bytes(self, etapa, quantidade):
+        with self._lock:
+            self.bytes[etapa] += quantidade
+
+    def registrar_tempos(self, tempos):
+        for etapa, duracao in (tempos or {}).items():
+            self.observar(etapa, duracao)
+
+    def to_dict(self):
+        with self._lock:
+            erros = {}
+            for (etapa, categoria), quantidade in sorted(self.erros.items()):
+                erros.setdefault(etapa, {})[categoria] = quantidade
+            return {
+                'latencias': {etapa: histograma.to_dict() for etapa, histograma in sorted(self.latencias.items())},
+                'erros': erros,
+                'bytes': dict(sorted(self.bytes.items()))
+            }
+
+    # Exporta no formato texto do Prometheus
+    def to_prometheus(self, prefixo=PREFIXO_PROMETHEUS):
+        linhas = []
+        with self._lock:
+            linhas.append(f'# TYPE {prefixo}_etapa_segundos histogram')
+            for etapa, histograma in sorted(self.latencias.items()):
+                acumulado = 0
+                for limite, contagem in zip(histograma.buckets, histograma.contagens):
+                    acumulado += contagem
+                    linhas.append(f'{prefixo}_etapa_segundos_bucket{{etapa="{etapa}",le="{limite}"}} {acumulado}')
+                linhas.append(f'{prefixo}_etapa_segundos_bucket{{etapa="{etapa}",le="+Inf"}} {histograma.total}')
+                linhas.append(f'{prefixo}_etapa_segundos_sum{{etapa="{etapa}"}} {histograma.soma}')
+                linhas.append(f'{prefixo}_etapa_segundos_count{{etapa="{etapa}"}} {histograma.total}')
+
+            linhas.append(f'# TYPE {prefixo}_erros_total counter')
+            for (etapa, categoria), quantidade in sorted(self.erros.items()):
+                linhas.append(f'{prefixo}_erros_total{{etapa="{etapa}",categoria="{categoria}"}} {quantidade}')
+
+            linhas.append(f'# TYPE {prefixo}_bytes_total counter')
+            for etapa, quantidade in sorted(self.bytes.items()):
+                linhas.append(f'{prefixo}_bytes_total{{etapa="{etapa}"}} {quantidade}')
+        return '\n'.join(linhas) + '\n'
+
+    # Grava o resumo em JSON ou, se o arquivo terminar em .prom, no formato do Prometheus
+    def salvar(self, caminho):
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            if caminho.endswith('.prom'):
+                arquivo.write(self.to_prometheus())
+            else:
+                json.dump(self.to_dict(), arquivo, indent=4, ensure_ascii=False)
+
+
+# Métricas usadas por todos os motores (trocadas com configurar_metricas)
+METRICAS = Metricas()
+
+# Função para trocar o registro de métricas (ex.: um novo por lote)
+def configurar_metricas(metricas=None):
+    global METRICAS
+    METRICAS = metricas if metricas is not None else Metricas()
+    return METRICAS
+
+def medir(etapa):
+    return METRICAS.medir(etapa)
+
+def registrar_erro(etapa, categoria):
+    METRICAS.registrar_erro(etapa, categoria)
+
+def registrar_bytes(etapa, quantidade):
+    METRICAS.registrar_bytes(etapa, quantidade)
+
+def registrar_tempos(tempos):
+    METRICAS.registrar_tempos(tempos)
@@ -0,0 +1,91 @@
+import json
+
+# Fonte registrada para os campos que vieram do Knowledge Graph da busca (e não de uma página)
+FONTE_KNOWLEDGE_GRAPH = 'knowledge_graph'
+
+
+# Registro com campos fixos (__slots__, sem um dicionário por instância).
+# Os resultados circulam como esses objetos entre os motores, o app e o lote;
+# a conversão para dicionário/JSON só acontece nas saídas.
+class Registro:
+    __slots__ = ()
+    # Valores padrão criados a cada instância (ex.: listas)
+    PADROES = {}
+
+    def __init__(self, **campos):
+        for campo in self.__slots__:
+            if campo in campos:
+                valor = campos.pop(campo)
+            else:
+                padrao = self.PADROES.get(campo)
+                valor = padrao() if padrao is not None else None
+            setattr(self, campo, valor)
+        if campos:
+            raise TypeError(f"Campos desconhecidos em {type(self).__name__}: {', '.join(campos)}")
+
+    @classmethod
+    def from_dict(cls, dados):
+        return cls(**{campo: dados[campo] for campo in cls.__slots__ if campo in (dados or {})})
+
+    def to_dict(self):
+        return {campo: getattr(self, campo) for campo in self.__slots__}
+
+    def to_json(self, indent=None):
+        return json.dumps(self.to_dict(), indent=indent, ensure_ascii=False)
+
+    def __eq__(self, outro):
+        return type(self) is type(outro) and self.to_dict() == outro.to_dict()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{campo}={getattr(self, campo)!r}' for campo in self.__slots__)})"
+
+
+# Dados do Knowledge Graph da página de busca. Só os campos encontrados vão para a saída.
+class KnowledgeGraph(Registro):
+    __slots__ = ('title', 'rating', 'review_count', 'price_range', 'description', 'address', 'phone', 'hours')
+
+    def to_dict(self):
+        return {campo: valor for campo, valor in super().to_dict().items() if valor is not None}
+
+
+# Contato consolidado de uma query pelo motor HTTP (um valor por campo).
+# 'sources' guarda a origem de cada campo: a URL da página ou FONTE_KNOWLEDGE_GRAPH.
+class ContactInfo(Registro):
+    __slots__ = ('email', 'phone', 'address', 'social_media_profiles', 'hours', 'sources')
+    PADROES = {'social_media_profiles': list, 'sources': dict}
+
+    def tem_contato(self):
+        return bool(self.email or self.phone or self.address)
+
+
+# Contato consolidado de uma query pelo Selenium (todos os e-mails válidos encontrados)
+class SeleniumContactInfo(Registro):
+    __slots__ = ('email', 'phone', 'social_media_profiles')
+    PADROES = {'email': list, 'phone': str, 'social_media_profiles': list}
+
+
+# Resultado de uma query (ou de um site) no motor HTTP
+class QueryResult(Registro):
+    __slots__ = ('knowledge_graph', 'contact_info')
+
+    @classmethod
+    def from_dict(cls, dados):
+        knowledge_graph = (dados or {}).get('knowledge_graph')
+        return cls(
+            knowledge_graph=KnowledgeGraph.from_dict(knowledge_graph) if knowledge_graph else None,
+            contact_info=ContactInfo.from_dict((dados or {}).get('consolidated_contact_info') or {})
+        )
+
+    # Mesmo formato do JSON produzido antes pelo process_single_query
+    def to_dict(self):
+        return {
+            'knowledge_graph': self.knowledge_graph.to_dict() if self.knowledge_graph is not None else None,
+            'consolidated_contact_info': self.contact_info.to_dict() if self.contact_info is not None else None
+        }
+
+
+# Dados combinados dos dois motores para uma empresa.
+# 'sources' guarda a origem de cada campo, como em ContactInfo (os do Selenium ficam sem origem).
+class CompanyData(Registro):
+    __slots__ = ('name', 'rating', 'review_count', 'address', 'phone', 'email', 'hours', 'social_media_profiles', 'sources')
+    PADROES = {'social_media_profiles': list, 'sources': dict}
@@ -0,0 +1,85 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from bs4 import BeautifulSoup
+
+# Backends opcionais: lxml (parser C usado pelo BeautifulSoup) e selectolax
+# (parser só de seletores, bem mais rápido para extrair texto)
+try:
+    import lxml  # noqa: F401
+    LXML_DISPONIVEL = True
+except ImportError:
+    LXML_DISPONIVEL = False
+
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+
+BACKENDS = ('html.parser', 'lxml', 'selectolax')
+BACKEND_PADRAO = 'html.parser'
+
+# Modos de execução do parsing:
+#  - 'process': pool de processos (usa todos os núcleos)
+#  - 'thread': pool de threads (útil com parsers em C que liberam o GIL)
+#  - 'inline': no próprio event loop, como era feito antes
+MODOS_PARSER = ('process', 'thread', 'inline')
+
+
+# Cria a árvore do BeautifulSoup com o builder do backend escolhido.
+# O selectolax não gera uma árvore do BeautifulSoup, então usa o lxml (ou html.parser) no lugar.
+def criar_soup(html, backend=BACKEND_PADRAO, parse_only=None):
+    if backend in ('lxml', 'selectolax') and LXML_DISPONIVEL:
+        return BeautifulSoup(html, 'lxml', parse_only=parse_only)
+    return BeautifulSoup(html, 'html.parser', parse_only=parse_only)
+
+# Retorna o texto visível do documento, com o backend mais rápido disponível, e os
+# destinos dos links (href), que trazem perfis sociais, mailto: e tel: fora do texto
+def extrair_texto_e_links(html, backend=BACKEND_PADRAO):
+    if backend == 'selectolax' and HTMLParser is not None:
+        arvore = HTMLParser(html)
+        if arvore.root is None:
+            return '', []
+        links = [a.attributes.get('href') or '' for a in arvore.css('a[href]')]
+        return arvore.root.text(separator=''), links
+
+    soup = criar_soup(html, backend)
+    links = [a['href'] for a in soup.find_all('a', href=True)]
+    return soup.get_text(), links
+
+
+# Pool que executa as funções de parsing fora do event loop
+class ParserPool:
+    def __init__(self, modo='process', workers=None, backend=BACKEND_PADRAO):
+        if modo not in MODOS_PARSER:
+            raise ValueError(f"Modo de parser inválido: {modo}")
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend de parser inválido: {backend}")
+        self.modo = modo
+        self.workers = workers or os.cpu_count() or 1
+        self.backend = backend
+        self._executor = None
+
+    def _obter_executor(self):
+        if self._executor is None:
+            if self.modo == 'process':
+                # 'spawn' evita herdar threads do processo pai (Selenium, tqdm) no fork
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='parser')
+        return self._executor
+
+    # Executa funcao(*args, backend=...) e devolve o resultado (dados simples, sem árvores)
+    async def run(self, funcao, *args):
+        if self.modo == 'inline':
+            return funcao(*args, backend=self.backend)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._obter_executor(), partial(funcao, *args, backend=self.backend))
+
+    def close(self, wait=False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
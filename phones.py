@@ -0,0 +1,94 @@
+import re
+from functools import lru_cache
+
+import phonenumbers
+
+# Quantidade de números normalizados mantidos em memória durante o lote
+TAMANHO_CACHE = 65536
+
+# Limites de dígitos de um telefone plausível (E.164 tem no máximo 15)
+MIN_DIGITOS = 8
+MAX_DIGITOS = 15
+# Números brasileiros: DDD + 8 ou 9 dígitos, opcionalmente com o 55 na frente
+DIGITOS_BR = (10, 11)
+DIGITOS_BR_COM_PAIS = (12, 13)
+# Números nacionais sem DDD: 0800, 0300, 0500 e 0900 (11 dígitos) e os de capitais 300x/400x (8 dígitos)
+PREFIXOS_NAO_GEOGRAFICOS = ('0300', '0500', '0800', '0900')
+PREFIXOS_CAPITAIS = ('300', '400')
+
+PADRAO_NAO_DIGITO = re.compile(r'\D')
+# Datas (01/02/2023, 2023-01-02) e valores (1.500,00) que o regex de telefone também captura
+PADRAO_DATA = re.compile(r'^\s*(?:\d{1,2}[./-]\d{1,2}[./-]\d{2,4}|\d{4}-\d{2}-\d{2})\s*$')
+PADRAO_VALOR = re.compile(r',\d{2}\s*$')
+
+
+# Filtro estrutural barato, aplicado antes do phonenumbers.
+# Retorna a chave normalizada do candidato ou None se ele não pode ser telefone.
+def chave_telefone(candidato, regiao='BR'):
+    if PADRAO_DATA.match(candidato) or PADRAO_VALOR.search(candidato):
+        return None
+
+    digitos = PADRAO_NAO_DIGITO.sub('', candidato)
+    if not MIN_DIGITOS <= len(digitos) <= MAX_DIGITOS or len(set(digitos)) == 1:
+        return None
+
+    if candidato.lstrip().startswith('+'):
+        return '+' + digitos
+
+    if regiao == 'BR':
+        if len(digitos) in DIGITOS_BR_COM_PAIS and digitos.startswith('55'):
+            digitos = digitos[2:]
+        if len(digitos) == 11 and digitos[:4] in PREFIXOS_NAO_GEOGRAFICOS:
+            return digitos
+        if len(digitos) == 8 and digitos[:3] in PREFIXOS_CAPITAIS:
+            return digitos
+        # Prefixo de tronco antes do DDD: (019) 3436-1234
+        if digitos[0] == '0' and len(digitos) - 1 in DIGITOS_BR:
+            digitos = digitos[1:]
+        # DDDs vão de 11 a 99
+        if len(digitos) not in DIGITOS_BR or digitos[0] == '0' or digitos[1] == '0':
+            return None
+
+    return digitos
+
+# Parse, validação e formatação com cache: cada número é processado uma única vez no lote
+@lru_cache(maxsize=TAMANHO_CACHE)
+def _normalizar(chave, regiao):
+    try:
+        numero_parseado = phonenumbers.parse(chave, regiao)
+    except phonenumbers.NumberParseException as e:
+        return None, str(e)
+
+    if not phonenumbers.is_valid_number(numero_parseado):
+        return None, "Número inválido"
+
+    formato_internacional = phonenumbers.format_number(numero_parseado, phonenumbers.PhoneNumberFormat.E164)
+    formato_nacional = phonenumbers.format_number(numero_parseado, phonenumbers.PhoneNumberFormat.NATIONAL)
+    return formato_internacional, formato_nacional
+
+# Valida e formata um número: retorna (E.164, nacional) ou (None, motivo)
+def normalizar_telefone(numero, regiao='BR'):
+    chave = chave_telefone(numero, regiao)
+    if chave is None:
+        return None, "Número inválido"
+    return _normalizar(chave, regiao)
+
+# Valida vários candidatos de uma vez, processando cada número distinto uma única vez.
+# Retorna os números válidos em E.164, sem repetição e na ordem em que apareceram.
+def validar_lote(candidatos, regiao='BR'):
+    validos = []
+    chaves_vistas = set()
+    for candidato in candidatos:
+        chave = chave_telefone(candidato, regiao)
+        if chave is None or chave in chaves_vistas:
+            continue
+        chaves_vistas.add(chave)
+
+        internacional, _ = _normalizar(chave, regiao)
+        if internacional and internacional not in validos:
+            validos.append(internacional)
+    return validos
+
+def estatisticas_cache():
+    info = _normalizar.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'tamanho': info.currsize}
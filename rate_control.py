@@ -0,0 +1,221 @@
+import asyncio
+import re
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from metrics import registrar_erro
+
+# Taxa (requisições por segundo) de cada host: (inicial, máxima). Hosts que não estão aqui
+# começam sem limite e só passam a ter uma taxa depois do primeiro bloqueio.
+TAXAS_HOST = {
+    'www.google.com': (1.0, 3.0),
+}
+# Taxa de um host sem limite depois do primeiro bloqueio e a máxima até onde ela volta a subir
+TAXA_APOS_BLOQUEIO = 2.0
+TAXA_MAXIMA = 20.0
+TAXA_MINIMA = 0.05
+# AIMD: cada resposta normal soma INCREMENTO à taxa; cada bloqueio multiplica por FATOR_REDUCAO
+INCREMENTO = 0.05
+FATOR_REDUCAO = 0.5
+# Requisições que podem sair de uma vez quando o host está ocioso
+RAJADA = 3
+# Segundos do prazo deixados para a própria requisição depois da espera pelo token
+FOLGA_REQUISICAO = 2.0
+
+# Circuito: depois de LIMITE_BLOQUEIOS bloqueios seguidos o host fica pausado por PAUSA_CIRCUITO
+# segundos (dobrando a cada nova abertura, até PAUSA_MAXIMA); depois, uma requisição de teste decide
+LIMITE_BLOQUEIOS = 3
+PAUSA_CIRCUITO = 60
+PAUSA_MAXIMA = 15 * 60
+
+# Etapas cujo conteúdo é examinado em busca de páginas de bloqueio (nos sites das empresas,
+# um formulário com captcha é comum e não indica bloqueio)
+ETAPAS_MONITORADAS = ('busca',)
+
+PADRAO_CAPTCHA = re.compile(
+    r'unusual traffic|tr[aá]fego incomum|id=["\']?captcha-form|g-recaptcha|/sorry/index|detected unusual', re.IGNORECASE)
+PADRAO_CONSENTIMENTO = re.compile(
+    r'consent\.google\.|before you continue to google|antes de ir para o google|action=["\']?https://consent\.', re.IGNORECASE)
+
+
+# A resposta indica que o host está limitando ou bloqueando as requisições.
+# 'espera' sugere quantos segundos aguardar antes de tentar o host de novo.
+class BloqueioDetectado(Exception):
+    def __init__(self, host, motivo, espera=0.0):
+        super().__init__(f'{host}: {motivo}')
+        self.host = host
+        self.motivo = motivo
+        self.espera = espera
+
+
+# O circuito do host está aberto: nenhuma requisição sai até o fim da pausa
+class HostPausado(BloqueioDetectado):
+    pass
+
+
+# Classifica a resposta: 'limite' (429), 'captcha', 'consentimento', 'proibido' (403 na busca) ou None
+def detectar_bloqueio(status, html, etapa=None):
+    if status == 429:
+        return 'limite'
+    if etapa not in ETAPAS_MONITORADAS:
+        return None
+    if status == 403:
+        return 'proibido'
+    if html:
+        if PADRAO_CAPTCHA.search(html):
+            return 'captcha'
+        if PADRAO_CONSENTIMENTO.search(html):
+            return 'consentimento'
+    return None
+
+
+# Balde de tokens de um host, com a taxa ajustada por AIMD e um disjuntor (circuito)
+class ControleHost:
+    def __init__(self, taxa=None, taxa_maxima=TAXA_MAXIMA, rajada=RAJADA):
+        self.taxa = taxa  # None: sem limite
+        self.taxa_maxima = taxa_maxima
+        self.rajada = rajada
+        self.tokens = rajada
+        self.atualizado = time.monotonic()
+        self.bloqueios_seguidos = 0
+        self.circuito = 'fechado'  # 'fechado', 'aberto' ou 'meio_aberto'
+        self.aberto_ate = 0.0
+        self.pausa = PAUSA_CIRCUITO
+        self.teste_em_andamento = False
+        self.requisicoes = 0
+        self.bloqueios = Counter()
+        self.aberturas = 0
+
+    # Reserva um token e retorna quantos segundos esperar por ele. Os tokens podem ficar
+    # negativos: cada requisição reserva o seu lugar na fila sem precisar de um lock.
+    def reservar(self, agora):
+        if self.taxa is None:
+            return 0.0
+        self.tokens = min(self.rajada, self.tokens + (agora - self.atualizado) * self.taxa)
+        self.atualizado = agora
+        self.tokens -= 1
+        return -self.tokens / self.taxa if self.tokens < 0 else 0.0
+
+    # Devolve o token de uma requisição que desistiu antes de sair
+    def devolver(self):
+        if self.taxa is not None:
+            self.tokens = min(self.rajada, self.tokens + 1)
+
+    # Requisições que o host atende em 'segundos' na taxa atual (None: sem limite)
+    def capacidade(self, segundos):
+        if self.taxa is None:
+            return None
+        return int(self.rajada + self.taxa * max(0.0, segundos - FOLGA_REQUISICAO))
+
+    def sucesso(self):
+        self.bloqueios_seguidos = 0
+        if self.circuito == 'meio_aberto':
+            self.circuito = 'fechado'
+            self.pausa = PAUSA_CIRCUITO
+        if self.taxa is not None:
+            self.taxa = min(self.taxa_maxima, self.taxa + INCREMENTO)
+
+    def bloqueio(self, motivo, agora):
+        self.bloqueios[motivo] += 1
+        self.bloqueios_seguidos += 1
+        self.taxa = TAXA_APOS_BLOQUEIO if self.taxa is None else max(TAXA_MINIMA, self.taxa * FATOR_REDUCAO)
+        self.tokens = min(self.tokens, 0)
+        if self.circuito == 'meio_aberto':
+            # O teste falhou: pausa de novo, por mais tempo
+            self.pausa = min(PAUSA_MAXIMA, self.pausa * 2)
+            self.abrir(agora)
+        elif self.bloqueios_seguidos >= LIMITE_BLOQUEIOS:
+            self.abrir(agora)
+
+    def abrir(self, agora):
+        self.circuito = 'aberto'
+        self.aberto_ate = agora + self.pausa
+        self.teste_em_andamento = False
+        self.aberturas += 1
+
+    def to_dict(self):
+        return {
+            'taxa': round(self.taxa, 3) if self.taxa is not None else None,
+            'circuito': self.circuito,
+            'requisicoes': self.requisicoes,
+            'bloqueios': dict(self.bloqueios),
+            'aberturas_circuito': self.aberturas
+        }
+
+
+# Controle de taxa por host: cada requisição espera o seu token; respostas de bloqueio
+# reduzem a taxa do host e, se persistirem, pausam o host inteiro
+class RateController:
+    def __init__(self, taxas_host=None):
+        self.taxas_host = dict(TAXAS_HOST if taxas_host is None else taxas_host)
+        self.hosts = {}
+
+    def _host(self, host):
+        controle = self.hosts.get(host)
+        if controle is None:
+            taxa, maxima = self.taxas_host.get(host, (None, TAXA_MAXIMA))
+            controle = ControleHost(taxa, maxima)
+            self.hosts[host] = controle
+        return controle
+
+    # Espera a vez da requisição e retorna quantos segundos esperou. Levanta HostPausado se o
+    # circuito do host estiver aberto e BloqueioDetectado ('fila') se a vez só chegaria depois
+    # do 'prazo' (em segundos): a query volta para a fila em vez de estourar o prazo esperando.
+    async def aguardar(self, url, prazo=None):
+        host = urlsplit(url).hostname or ''
+        controle = self._host(host)
+        agora = time.monotonic()
+        if controle.circuito == 'aberto':
+            if agora < controle.aberto_ate:
+                raise HostPausado(host, 'circuito', controle.aberto_ate - agora)
+            controle.circuito = 'meio_aberto'
+        if controle.circuito == 'meio_aberto':
+            # Só uma requisição de teste por vez enquanto o circuito está meio aberto
+            if controle.teste_em_andamento:
+                raise HostPausado(host, 'circuito', controle.pausa)
+            controle.teste_em_andamento = True
+        espera = controle.reservar(agora)
+        if prazo is not None and espera > prazo - FOLGA_REQUISICAO:
+            controle.devolver()
+            controle.teste_em_andamento = False
+            registrar_erro('bloqueio', 'fila')
+            raise BloqueioDetectado(host, 'fila', espera)
+        if espera > 0:
+            try:
+                await asyncio.sleep(espera)
+            except BaseException:
+                controle.devolver()
+                controle.teste_em_andamento = False
+                raise
+        controle.requisicoes += 1
+        return espera
+
+    # Registra o resultado da requisição (motivo do bloqueio ou None) e levanta
+    # BloqueioDetectado quando a resposta foi um bloqueio
+    def registrar(self, url, motivo):
+        host = urlsplit(url).hostname or ''
+        controle = self._host(host)
+        controle.teste_em_andamento = False
+        if motivo is None:
+            controle.sucesso()
+            return
+        agora = time.monotonic()
+        controle.bloqueio(motivo, agora)
+        registrar_erro('bloqueio', motivo)
+        espera = controle.aberto_ate - agora if controle.circuito == 'aberto' else 1 / controle.taxa
+        raise BloqueioDetectado(host, motivo, espera)
+
+    # Requisições que o host da url atende em 'segundos' (None: sem limite)
+    def capacidade(self, url, segundos):
+        return self._host(urlsplit(url).hostname or '').capacidade(segundos)
+
+    # Libera o teste do circuito meio aberto quando a requisição falhou sem resposta
+    def cancelar(self, url):
+        controle = self.hosts.get(urlsplit(url).hostname or '')
+        if controle is not None:
+            controle.teste_em_andamento = False
+
+    def estatisticas(self):
+        return {host: controle.to_dict() for host, controle in sorted(self.hosts.items())
+                if controle.taxa is not None or controle.bloqueios}
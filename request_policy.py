@@ -0,0 +1,161 @@
+import asyncio
+import random
+import time
+from contextvars import ContextVar
+
+import aiohttp
+
+from metrics import registrar_erro
+
+# Tempo total que uma query pode levar, da busca à última subpágina
+ORCAMENTO_QUERY = 30
+# Fração do orçamento da query que cada etapa pode usar a partir do momento em que começa
+# (nunca passando do prazo final da query)
+FRACOES_ETAPA = {
+    'busca': 0.3,
+    'site': 0.5,
+    'subpagina': 0.3,
+    'posts': 0.3,
+}
+
+# Retentativas: espera aleatória entre 0 e ESPERA_BASE * 2^tentativa ("full jitter"), até ESPERA_MAXIMA
+TENTATIVAS = 3
+ESPERA_BASE = 0.25
+ESPERA_MAXIMA = 4
+STATUS_TRANSITORIOS = frozenset({408, 425, 429, 500, 502, 503, 504})
+ERROS_TRANSITORIOS = (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)
+
+# Segundos até disparar uma cópia de uma requisição lenta (None desliga)
+HEDGE_APOS = None
+
+
+# Prazo absoluto de uma query ou etapa
+class Prazo:
+    def __init__(self, segundos, limite=None):
+        self.segundos = segundos
+        self.limite = limite if limite is not None else time.monotonic() + segundos
+
+    def restante(self):
+        return max(0.0, self.limite - time.monotonic())
+
+    def esgotado(self):
+        return self.restante() <= 0
+
+    # Prazo de uma etapa: uma fração do orçamento total, sem ultrapassar este prazo
+    def etapa(self, fracao):
+        segundos = self.segundos * fracao
+        return Prazo(segundos, limite=min(self.limite, time.monotonic() + segundos))
+
+
+# Prazo da query em andamento (definido por process_single_query em cada tarefa)
+PRAZO = ContextVar('prazo', default=None)
+
+def prazo_da_etapa(etapa):
+    prazo = PRAZO.get()
+    if prazo is None:
+        return None
+    return prazo.etapa(FRACOES_ETAPA.get(etapa, 1.0))
+
+
+# Executa requisições idempotentes com retentativas para erros transitórios,
+# respeitando o prazo da etapa, e opcionalmente com uma cópia ("hedge") quando
+# a primeira tentativa demora mais que hedge_apos segundos
+class RequestPolicy:
+    def __init__(self, tentativas=TENTATIVAS, espera_base=ESPERA_BASE, espera_maxima=ESPERA_MAXIMA,
+                 hedge_apos=HEDGE_APOS, status_transitorios=STATUS_TRANSITORIOS):
+        self.tentativas = max(1, tentativas)
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.hedge_apos = hedge_apos
+        self.status_transitorios = frozenset(status_transitorios)
+        self.retentativas = 0
+        self.hedges = 0
+        self.hedges_vencedores = 0  # Vezes em que a cópia respondeu antes da original
+
+    def espera(self, tentativa):
+        return random.uniform(0, min(self.espera_maxima, self.espera_base * 2 ** tentativa))
+
+    # 'fabrica(timeout)' cria a corrotina de uma tentativa, que retorna (status, texto)
+    async def executar(self, fabrica, etapa='pagina', prazo=None):
+        tentativa = 0
+        while True:
+            timeout = prazo.restante() if prazo is not None else None
+            if timeout is not None and timeout <= 0:
+                raise asyncio.TimeoutError()
+
+            erro, resultado = None, None
+            try:
+                resultado = await self._tentar(fabrica, timeout, etapa)
+            except ERROS_TRANSITORIOS as e:
+                erro = e
+            else:
+                if resultado[0] not in self.status_transitorios:
+                    return resultado
+
+            tentativa += 1
+            espera = self.espera(tentativa - 1)
+            if tentativa >= self.tentativas or (prazo is not None and espera >= prazo.restante()):
+                if erro is not None:
+                    raise erro
+                return resultado
+
+            self.retentativas += 1
+            registrar_erro(etapa, 'retentativa')
+            await asyncio.sleep(espera)
+
+    async def _tentar(self, fabrica, timeout, etapa):
+        if not self.hedge_apos or (timeout is not None and timeout <= self.hedge_apos):
+            return await fabrica(timeout)
+
+        pendentes = {asyncio.ensure_future(fabrica(timeout))}
+        original = next(iter(pendentes))
+        try:
+            concluidas, pendentes = await asyncio.wait(pendentes, timeout=self.hedge_apos)
+            if not concluidas:
+                self.hedges += 1
+                registrar_erro(etapa, 'hedge')
+                restante = timeout - self.hedge_apos if timeout is not None else None
+                pendentes.add(asyncio.ensure_future(fabrica(restante)))
+
+            # Vale a primeira que responder; se uma falhar, espera a outra
+            erro = None
+            while concluidas or pendentes:
+                for tarefa in concluidas:
+                    if tarefa.exception() is None:
+                        if tarefa is not original:
+                            self.hedges_vencedores += 1
+                        return tarefa.result()
+                    erro = erro or tarefa.exception()
+                if not pendentes:
+                    break
+                concluidas, pendentes = await asyncio.wait(pendentes, return_when=asyncio.FIRST_COMPLETED)
+            raise erro
+        finally:
+            for tarefa in pendentes:
+                tarefa.cancel()
+
+    def estatisticas(self):
+        return {
+            'retentativas': self.retentativas,
+            'hedges': self.hedges,
+            'hedges_vencedores': self.hedges_vencedores
+        }
+
+
+# Aguarda as tarefas até o prazo e devolve os resultados das que terminaram
+# (na ordem original); as que não terminaram a tempo são canceladas
+async def reunir_ate_o_prazo(aguardaveis, prazo=None, etapa='query_sites'):
+    tarefas = [asyncio.ensure_future(aguardavel) for aguardavel in aguardaveis]
+    if not tarefas:
+        return []
+    timeout = prazo.restante() if prazo is not None else None
+    pendentes = set(tarefas)
+    try:
+        _, pendentes = await asyncio.wait(tarefas, timeout=timeout)
+        for _ in pendentes:
+            registrar_erro(etapa, 'prazo')
+    finally:
+        for tarefa in pendentes:
+            tarefa.cancel()
+    return [tarefa.result() for tarefa in tarefas
+            if tarefa not in pendentes and not tarefa.cancelled() and tarefa.exception() is None]
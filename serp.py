@@ -0,0 +1,145 @@
+import re
+
+from bs4 import SoupStrainer, Tag
+
+from parsing import BACKEND_PADRAO, criar_soup
+
+# No bs4 4.13+ o filtro de parsing é uma subclasse de ElementFilter;
+# nas versões anteriores, o SoupStrainer aceita uma função (nome, atributos)
+try:
+    from bs4 import ElementFilter
+except ImportError:
+    ElementFilter = None
+
+# Seletores da página de resultados do Google em um único lugar.
+# Knowledge Graph: campo -> (tag, atributo, valor). Vale o primeiro elemento encontrado.
+SELETORES_KNOWLEDGE_GRAPH = {
+    'title': ('div', 'data-attrid', 'title'),
+    'rating': ('span', 'class', 'Aq14fc'),
+    'review_count': ('span', 'class', 'hqzQac'),
+    'price_range': ('span', 'class', 'rRfnje'),
+    'description': ('div', 'data-attrid', 'kc:/location/location:short_description'),
+    'address': ('div', 'data-attrid', 'kc:/location/location:address'),
+    'hours': ('div', 'data-attrid', 'kc:/location/location:hours'),
+}
+# Telefone do Knowledge Graph: um <span> (dentro das regiões abaixo) cujo texto é só o número
+SELETOR_TELEFONE_KNOWLEDGE_GRAPH = ('span', re.compile(r'^\(?\+?[0-9]{1,4}\)?[\s.-]?[0-9]{1,4}[\s.-]?[0-9]{1,4}[\s.-]?[0-9]{1,9}$'))
+
+# Resultados normais da busca e os campos dentro de cada bloco
+SELETOR_RESULTADO = ('div', 'class', 'g')
+SELETOR_TITULO_RESULTADO = 'h3'
+SELETOR_LINK_RESULTADO = 'a'
+SELETOR_SNIPPET_RESULTADO = ('span', 'class', 'aCOpRe')
+
+# Scripts e estilos ocupam a maior parte do HTML da busca e nada é extraído deles,
+# então são removidos antes de montar a árvore
+PADRAO_SCRIPTS = re.compile(r'<(script|style)\b[^>]*>.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+
+
+def _casa_atributo(elemento, atributo, valor):
+    atual = elemento.get(atributo)
+    if atributo == 'class':
+        return atual is not None and valor in atual
+    return atual == valor
+
+def _casa(elemento, tag, atributo, valor):
+    return elemento.name == tag and _casa_atributo(elemento, atributo, valor)
+
+# Só as regiões que contêm algum seletor viram árvore: nós com data-attrid
+# (Knowledge Graph), as classes da tabela e os blocos de resultado.
+# Todo o resto da página é descartado durante o parsing.
+CLASSES_REGIOES = {valor for _, atributo, valor in SELETORES_KNOWLEDGE_GRAPH.values() if atributo == 'class'} | {SELETOR_RESULTADO[2]}
+
+def regiao_necessaria(nome, attrs=None):
+    attrs = attrs or {}
+    if 'data-attrid' in attrs:
+        return True
+    classes = attrs.get('class') or ''
+    if not isinstance(classes, str):
+        classes = ' '.join(classes)
+    return not CLASSES_REGIOES.isdisjoint(classes.split())
+
+if ElementFilter is not None:
+    class FiltroRegioes(ElementFilter):
+        def allow_tag_creation(self, nsprefix, name, attrs):
+            return regiao_necessaria(name, attrs)
+
+        def allow_string_creation(self, string):
+            return False
+
+    def criar_filtro_regioes():
+        return FiltroRegioes()
+else:
+    def criar_filtro_regioes():
+        return SoupStrainer(regiao_necessaria)
+
+# Índice por nome de tag para testar cada elemento só contra os seletores possíveis
+def _indexar_seletores():
+    indice = {}
+    for campo, (tag, atributo, valor) in SELETORES_KNOWLEDGE_GRAPH.items():
+        indice.setdefault(tag, []).append((campo, atributo, valor))
+    return indice
+
+INDICE_KNOWLEDGE_GRAPH = _indexar_seletores()
+
+
+# Extrai o Knowledge Graph e os resultados da busca percorrendo a árvore uma única vez
+def parse_serp(html, backend=BACKEND_PADRAO):
+    soup = criar_soup(PADRAO_SCRIPTS.sub('', html), backend, parse_only=criar_filtro_regioes())
+
+    knowledge_data = {}
+    resultados = []
+    tag_telefone, padrao_telefone = SELETOR_TELEFONE_KNOWLEDGE_GRAPH
+
+    # Pilha de (elemento, blocos de resultado que o contêm)
+    pilha = [(soup, ())]
+    while pilha:
+        elemento, blocos = pilha.pop()
+
+        for campo, atributo, valor in INDICE_KNOWLEDGE_GRAPH.get(elemento.name, ()):
+            if campo not in knowledge_data and _casa_atributo(elemento, atributo, valor):
+                knowledge_data[campo] = elemento.get_text()
+
+        if 'phone' not in knowledge_data and elemento.name == tag_telefone:
+            if elemento.string and padrao_telefone.match(elemento.string):
+                knowledge_data['phone'] = elemento.get_text()
+
+        if _casa(elemento, *SELETOR_RESULTADO):
+            bloco = {}
+            resultados.append(bloco)
+            blocos = blocos + (bloco,)
+
+        # Campos dentro de um bloco de resultado valem para todos os blocos que o contêm
+        for bloco in blocos:
+            if 'title' not in bloco and elemento.name == SELETOR_TITULO_RESULTADO:
+                bloco['title'] = elemento.text
+            if 'a' not in bloco and elemento.name == SELETOR_LINK_RESULTADO:
+                bloco['a'] = elemento
+            if 'snippet' not in bloco and _casa(elemento, *SELETOR_SNIPPET_RESULTADO):
+                bloco['snippet'] = elemento.text
+
+        filhos = [filho for filho in elemento.contents if isinstance(filho, Tag)]
+        for filho in reversed(filhos):
+            pilha.append((filho, blocos))
+
+    # Mantém os campos na ordem da tabela, com o telefone antes do horário
+    ordem = [campo for campo in SELETORES_KNOWLEDGE_GRAPH if campo != 'hours'] + ['phone', 'hours']
+    knowledge_data = {campo: knowledge_data[campo] for campo in ordem if campo in knowledge_data}
+
+    results = []
+    if knowledge_data:
+        results.append({
+            'title': knowledge_data.get('title', 'No title'),
+            'link': 'Info do Knowledge Graph',
+            'knowledge_data': knowledge_data
+        })
+
+    for bloco in resultados:
+        a_tag = bloco.get('a')
+        results.append({
+            'title': bloco.get('title', "No title"),
+            'link': a_tag['href'] if a_tag is not None and a_tag.has_attr('href') else None,
+            'snippet': bloco.get('snippet', "No snippet")
+        })
+
+    return results
@@ -0,0 +1,60 @@
+import asyncio
+from collections import OrderedDict
+
+# Resultados guardados por padrão; acima disso saem os usados há mais tempo
+MAX_MEMORIZADOS = 10000
+
+
+# Agrupa chamadas concorrentes com a mesma chave em uma única execução
+# ("single-flight") e, opcionalmente, memoriza o resultado para o resto do lote.
+# 'memorizavel(resultado)' decide quais resultados ficam guardados (ex.: não os de erro).
+class SingleFlight:
+    def __init__(self, memorizar=True, max_memorizados=MAX_MEMORIZADOS, memorizavel=None):
+        self.memorizar = memorizar
+        self.max_memorizados = max_memorizados
+        self.memorizavel = memorizavel
+        self.execucoes = 0    # Vezes em que a função foi de fato executada
+        self.coalescidas = 0  # Chamadas que aguardaram uma execução já em andamento
+        self.memorizadas = 0  # Chamadas atendidas por um resultado já pronto
+        self._em_andamento = {}
+        self._resultados = OrderedDict()
+
+    async def do(self, chave, fabrica):
+        if chave in self._resultados:
+            self.memorizadas += 1
+            self._resultados.move_to_end(chave)
+            return self._resultados[chave]
+
+        task = self._em_andamento.get(chave)
+        if task is None:
+            # A execução roda em uma tarefa própria: se quem a iniciou for
+            # cancelado, as outras chamadas esperando a mesma chave não são afetadas.
+            # A tarefa recebe uma cópia do contexto de quem chegou primeiro: o que depender
+            # de quem chamou (ex.: o prazo da query) a fábrica deve redefinir.
+            self.execucoes += 1
+            task = asyncio.ensure_future(fabrica())
+            self._em_andamento[chave] = task
+            task.add_done_callback(lambda t: self._concluir(chave, t))
+        else:
+            self.coalescidas += 1
+
+        return await asyncio.shield(task)
+
+    def _concluir(self, chave, task):
+        self._em_andamento.pop(chave, None)
+        # Exceções (e resultados não memorizáveis) não são memorizadas: a próxima chamada tenta de novo
+        if task.cancelled() or task.exception() is not None or not self.memorizar:
+            return
+        resultado = task.result()
+        if self.memorizavel is not None and not self.memorizavel(resultado):
+            return
+        self._resultados[chave] = resultado
+        while len(self._resultados) > self.max_memorizados:
+            self._resultados.popitem(last=False)
+
+    def estatisticas(self):
+        return {
+            'execucoes': self.execucoes,
+            'coalescidas': self.coalescidas,
+            'memorizadas': self.memorizadas
+        }
@@ -0,0 +1,29 @@
+import json
+import os
+
+
+# Grava um registro JSON por linha, com flush a cada escrita: o que já foi
+# processado fica no disco mesmo se a execução for interrompida
+class JsonlSink:
+    def __init__(self, caminho, modo='a'):
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        self.caminho = caminho
+        self.escritos = 0
+        self._arquivo = open(caminho, modo, encoding='utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def escrever(self, registro):
+        self._arquivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+        self._arquivo.flush()
+        self.escritos += 1
+
+    def close(self):
+        if not self._arquivo.closed:
+            self._arquivo.close()
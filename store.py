@@ -0,0 +1,236 @@
+import json
+import sqlite3
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from canonical import canonicalizar_query
+from models import FONTE_KNOWLEDGE_GRAPH, CompanyData, ContactInfo, KnowledgeGraph, QueryResult
+
+# Depois disso (em segundos) os dados de uma empresa são buscados de novo
+MAX_IDADE = 30 * 24 * 60 * 60
+# Empresas com campos obrigatórios faltando são buscadas de novo depois disso
+# (evita repetir a cada execução as que realmente não publicam o contato)
+INTERVALO_FALTANTES = 24 * 60 * 60
+CAMPOS_OBRIGATORIOS = ('email', 'phone', 'address')
+
+# Campos guardados de cada empresa (os nomes do CompanyData)
+CAMPOS = ('name', 'rating', 'review_count', 'email', 'phone', 'address', 'hours', 'social_media_profiles')
+
+# Hosts compartilhados por várias empresas: o perfil (primeiro trecho do caminho) faz parte do domínio
+HOSTS_COMPARTILHADOS = ('facebook.com', 'instagram.com', 'linkedin.com', 'twitter.com', 'x.com', 'youtube.com',
+                        'tiktok.com', 'linktr.ee', 'wa.me')
+
+# Diretórios, agregadores, encurtadores e links de contato: o endereço não identifica uma empresa
+# (várias empresas da mesma planilha apontam para eles), então não viram domínio
+HOSTS_SEM_DOMINIO = ('google.com', 'goo.gl', 'g.page', 'whatsapp.com', 'bit.ly', 'tinyurl.com', 'doctoralia.com.br',
+                     'guiamais.com.br', 'apontador.com.br', 'telelistas.net', 'reclameaqui.com.br', 'ifood.com.br')
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS empresas (
+    id INTEGER PRIMARY KEY,
+    nome TEXT,
+    dominio TEXT,
+    verificado_em REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS empresas_nome ON empresas (nome);
+CREATE UNIQUE INDEX IF NOT EXISTS empresas_dominio ON empresas (dominio) WHERE dominio IS NOT NULL;
+CREATE TABLE IF NOT EXISTS campos (
+    empresa_id INTEGER NOT NULL REFERENCES empresas (id),
+    campo TEXT NOT NULL,
+    valor TEXT NOT NULL,
+    fonte TEXT,
+    atualizado_em REAL NOT NULL,
+    PRIMARY KEY (empresa_id, campo)
+);
+"""
+
+
+# "Padaria São João Ltda." -> "padaria sao joao" (a mesma forma canônica das queries)
+def normalizar_nome(nome):
+    return canonicalizar_query(nome) or None
+
+def host_em(host, hosts):
+    return any(host == outro or host.endswith('.' + outro) for outro in hosts)
+
+# "https://www.exemplo.com.br/contato" -> "exemplo.com.br"; "https://instagram.com/loja/" -> "instagram.com/loja";
+# "https://business.google.com/..." -> None (ver HOSTS_SEM_DOMINIO)
+def normalizar_dominio(url):
+    if not url:
+        return None
+    partes = urlsplit(url if '//' in url else f'//{url}')
+    host = (partes.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if not host or host_em(host, HOSTS_SEM_DOMINIO):
+        return None
+    if host_em(host, HOSTS_COMPARTILHADOS):
+        perfil = next((trecho for trecho in partes.path.lower().split('/') if trecho), None)
+        return f'{host}/{perfil}' if perfil else None
+    return host
+
+def vazio(valor):
+    return valor is None or valor == '' or valor == [] or valor == {}
+
+# Campos e fontes de um resultado do motor HTTP (QueryResult) ou combinado (CompanyData)
+def campos_do_resultado(resultado):
+    if isinstance(resultado, CompanyData):
+        return resultado.to_dict(), dict(resultado.sources or {})
+
+    knowledge_graph = resultado.knowledge_graph or KnowledgeGraph()
+    info = resultado.contact_info or ContactInfo()
+    campos = {
+        'name': knowledge_graph.title,
+        'rating': knowledge_graph.rating,
+        'review_count': knowledge_graph.review_count,
+        'email': info.email,
+        'phone': info.phone,
+        'address': info.address,
+        'hours': info.hours,
+        'social_media_profiles': info.social_media_profiles
+    }
+    fontes = dict(info.sources or {})
+    for campo in ('name', 'rating', 'review_count'):
+        fontes[campo] = FONTE_KNOWLEDGE_GRAPH
+    return campos, fontes
+
+# Site da empresa segundo as fontes do resultado: o domínio de onde veio a maior parte dos campos
+# (None se os campos vieram só do Knowledge Graph ou de hosts que não identificam a empresa)
+def site_do_resultado(resultado):
+    if resultado is None:
+        return None
+    _, fontes = campos_do_resultado(resultado)
+    dominios = Counter(normalizar_dominio(fonte) for fonte in fontes.values() if fonte and fonte != FONTE_KNOWLEDGE_GRAPH)
+    dominios.pop(None, None)
+    return dominios.most_common(1)[0][0] if dominios else None
+
+
+# Dados de contato consolidados por empresa, guardados entre execuções em um SQLite local.
+# Cada empresa é encontrada pelo domínio do site ou, sem ele, pelo nome normalizado;
+# cada campo guarda o valor, a fonte e quando foi encontrado.
+class EnrichmentStore:
+    def __init__(self, caminho='enriquecimento.db', max_idade=MAX_IDADE, intervalo_faltantes=INTERVALO_FALTANTES,
+                 campos_obrigatorios=CAMPOS_OBRIGATORIOS):
+        self.caminho = caminho
+        self.max_idade = max_idade
+        self.intervalo_faltantes = intervalo_faltantes
+        self.campos_obrigatorios = tuple(campos_obrigatorios)
+        self._conexao = sqlite3.connect(caminho)
+        self._conexao.executescript(ESQUEMA)
+        self.motivos = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._conexao.close()
+
+    # Retorna o id da empresa (ou None): primeiro pelo domínio, depois pelo nome
+    def localizar(self, nome=None, dominio=None):
+        dominio = normalizar_dominio(dominio)
+        if dominio:
+            linha = self._conexao.execute('SELECT id FROM empresas WHERE dominio = ?', (dominio,)).fetchone()
+            if linha:
+                return linha[0]
+        nome = normalizar_nome(nome)
+        if nome:
+            # Uma empresa com outro domínio é outra empresa, mesmo com o mesmo nome
+            linha = self._conexao.execute(
+                'SELECT id FROM empresas WHERE nome = ? AND (dominio IS NULL OR ? IS NULL) ORDER BY verificado_em DESC',
+                (nome, dominio)
+            ).fetchone()
+            if linha:
+                return linha[0]
+        return None
+
+    # Campos guardados de uma empresa: campo -> {'valor', 'fonte', 'atualizado_em'}
+    def campos(self, nome=None, dominio=None):
+        empresa_id = self.localizar(nome, dominio)
+        if empresa_id is None:
+            return {}
+        linhas = self._conexao.execute(
+            'SELECT campo, valor, fonte, atualizado_em FROM campos WHERE empresa_id = ?', (empresa_id,)
+        )
+        return {campo: {'valor': json.loads(valor), 'fonte': fonte, 'atualizado_em': atualizado_em}
+                for campo, valor, fonte, atualizado_em in linhas}
+
+    # Motivo para buscar a empresa de novo ('nova', 'desatualizada', 'incompleta') ou None se os dados servem
+    def motivo_atualizacao(self, nome=None, dominio=None, agora=None):
+        agora = agora if agora is not None else time.time()
+        empresa_id = self.localizar(nome, dominio)
+        if empresa_id is None:
+            return 'nova'
+        verificado_em = self._conexao.execute('SELECT verificado_em FROM empresas WHERE id = ?', (empresa_id,)).fetchone()[0]
+        idade = agora - verificado_em
+        if idade >= self.max_idade:
+            return 'desatualizada'
+        presentes = {campo for (campo,) in self._conexao.execute('SELECT campo FROM campos WHERE empresa_id = ?', (empresa_id,))}
+        # Sem nenhum campo guardado não há o que reaproveitar: busca de novo sem esperar o intervalo
+        if not presentes:
+            return 'incompleta'
+        if any(campo not in presentes for campo in self.campos_obrigatorios) and idade >= self.intervalo_faltantes:
+            return 'incompleta'
+        return None
+
+    # Mesmo que motivo_atualizacao, mas contando os motivos para as estatísticas
+    def precisa_atualizar(self, nome=None, dominio=None, agora=None):
+        motivo = self.motivo_atualizacao(nome, dominio, agora) or 'atual'
+        self.motivos[motivo] = self.motivos.get(motivo, 0) + 1
+        return motivo != 'atual'
+
+    # Grava o resultado de uma busca (QueryResult ou CompanyData). Só os campos encontrados
+    # são sobrescritos: uma busca que não achou o telefone não apaga o telefone de antes.
+    def registrar(self, nome, dominio, resultado, agora=None):
+        agora = agora if agora is not None else time.time()
+        nome, dominio = normalizar_nome(nome), normalizar_dominio(dominio)
+        campos, fontes = campos_do_resultado(resultado) if resultado is not None else ({}, {})
+
+        with self._conexao:
+            empresa_id = self.localizar(nome, dominio)
+            if empresa_id is None:
+                empresa_id = self._conexao.execute(
+                    'INSERT INTO empresas (nome, dominio, verificado_em) VALUES (?, ?, ?)', (nome, dominio, agora)
+                ).lastrowid
+            else:
+                self._conexao.execute(
+                    'UPDATE empresas SET nome = COALESCE(?, nome), dominio = COALESCE(dominio, ?), verificado_em = ? WHERE id = ?',
+                    (nome, dominio, agora, empresa_id)
+                )
+            for campo in CAMPOS:
+                valor = campos.get(campo)
+                if vazio(valor):
+                    continue
+                self._conexao.execute(
+                    'INSERT OR REPLACE INTO campos (empresa_id, campo, valor, fonte, atualizado_em) VALUES (?, ?, ?, ?, ?)',
+                    (empresa_id, campo, json.dumps(valor, ensure_ascii=False), fontes.get(campo), agora)
+                )
+        return empresa_id
+
+    # Remonta o QueryResult a partir dos campos guardados (None se a empresa não existe)
+    def resultado(self, nome=None, dominio=None):
+        campos = self.campos(nome, dominio)
+        if not campos:
+            return None
+        valores = {campo: dados['valor'] for campo, dados in campos.items()}
+        knowledge_graph = None
+        if any(campo in valores for campo in ('name', 'rating', 'review_count')):
+            knowledge_graph = KnowledgeGraph(title=valores.get('name'), rating=valores.get('rating'),
+                                             review_count=valores.get('review_count'))
+        return QueryResult(
+            knowledge_graph=knowledge_graph,
+            contact_info=ContactInfo(
+                email=valores.get('email'),
+                phone=valores.get('phone'),
+                address=valores.get('address'),
+                hours=valores.get('hours'),
+                social_media_profiles=valores.get('social_media_profiles', []),
+                sources={campo: dados['fonte'] for campo, dados in campos.items() if dados['fonte']}
+            )
+        )
+
+    def estatisticas(self):
+        empresas, = self._conexao.execute('SELECT COUNT(*) FROM empresas').fetchone()
+        return {'empresas': empresas, 'motivos': dict(self.motivos)}
@@ -0,0 +1,126 @@
+import asyncio
+import re
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from metrics import medir, registrar_erro
+from waits import esperar_pagina_carregada
+
+# Hosts de construtores de sites que montam a página no navegador; vão direto para o navegador
+HOSTS_JS = ('wixsite.com', 'wix.com', 'webflow.io', 'linktr.ee', 'bubbleapps.io', 'glide.page')
+# Abaixo disso (em caracteres de texto visível) a página é considerada vazia
+MIN_TEXTO_VISIVEL = 200
+# Quantos escalonamentos recentes ficam guardados, com a URL e o motivo
+MAX_REGISTRO = 200
+# Tempo máximo (em segundos) de uma página no navegador, da espera por um navegador livre ao HTML
+TIMEOUT_NAVEGADOR = 20
+
+PADRAO_SCRIPTS = re.compile(r'<(script|style|noscript)\b[^>]*>.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+PADRAO_TAGS = re.compile(r'<[^>]+>')
+PADRAO_ESPACOS = re.compile(r'\s+')
+# Elemento raiz vazio de aplicações React, Vue, Next, Nuxt, Angular
+PADRAO_RAIZ_SPA = re.compile(r'<(div|app-root)[^>]*\bid=["\']?(root|app|__next|__nuxt|app-root)\b[^>]*>\s*</\1>', re.IGNORECASE)
+PADRAO_NOSCRIPT_JS = re.compile(r'<noscript\b[^>]*>(?:(?!</noscript>).)*javascript', re.IGNORECASE | re.DOTALL)
+
+
+def host_js(url, hosts_js=HOSTS_JS):
+    host = (urlsplit(url).hostname or '').lower()
+    return any(host == dominio or host.endswith('.' + dominio) for dominio in hosts_js)
+
+# Texto visível aproximado, sem montar a árvore (só para a heurística)
+def tamanho_texto_visivel(html):
+    sem_scripts = PADRAO_SCRIPTS.sub(' ', html)
+    return len(PADRAO_ESPACOS.sub('', PADRAO_TAGS.sub(' ', sem_scripts)))
+
+# Decide se a página baixada por HTTP precisa de um navegador; retorna o motivo ou None.
+# Respostas de erro e corpos vazios (conteúdo que não é HTML, ignorado na leitura) não sobem.
+def motivo_escalonamento(status, html, min_texto=MIN_TEXTO_VISIVEL):
+    if status != 200 or not html:
+        return None
+    if tamanho_texto_visivel(html) >= min_texto:
+        return None
+    if PADRAO_RAIZ_SPA.search(html):
+        return 'spa'
+    if PADRAO_NOSCRIPT_JS.search(html):
+        return 'noscript'
+    if '<script' in html.lower():
+        return 'so_scripts'
+    return 'vazia'
+
+
+# Busca em camadas: tenta o HTTP primeiro e só usa um navegador do pool quando
+# a heurística indica que a página depende de JavaScript.
+# Os navegadores rodam em threads próprias, uma por navegador do pool: o executor padrão
+# do asyncio também resolve o DNS do aiohttp e não pode ficar ocupado esperando o Selenium.
+class TieredFetcher:
+    def __init__(self, pool, hosts_js=HOSTS_JS, min_texto=MIN_TEXTO_VISIVEL, timeout_navegador=TIMEOUT_NAVEGADOR):
+        self.pool = pool
+        self.hosts_js = tuple(hosts_js)
+        self.min_texto = min_texto
+        self.timeout_navegador = timeout_navegador
+        self.executor = ThreadPoolExecutor(max_workers=pool.tamanho, thread_name_prefix='navegador')
+        self.http = 0
+        self.navegador = 0
+        self.falhas_navegador = 0
+        self.motivos = Counter()
+        self.registro = deque(maxlen=MAX_REGISTRO)
+
+    # 'buscar_http()' cria a corrotina da busca por HTTP, que retorna (status, html);
+    # 'renderizar(url)' troca a renderização direta (ex.: para passar pelo cache e pelo controle de taxa)
+    async def buscar(self, url, buscar_http, renderizar=None):
+        resultado = None
+        if host_js(url, self.hosts_js):
+            motivo = 'host_js'
+        else:
+            resultado = await buscar_http()
+            motivo = motivo_escalonamento(*resultado, min_texto=self.min_texto)
+            if motivo is None:
+                self.http += 1
+                return resultado
+
+        self.motivos[motivo] += 1
+        self.registro.append((url, motivo))
+        registrar_erro('escalonamento', motivo)
+        try:
+            with medir('navegador'):
+                html = await (renderizar or self.renderizar)(url)
+        except Exception:
+            # Sem navegador, fica com o que o HTTP trouxe
+            self.falhas_navegador += 1
+            return resultado if resultado is not None else await buscar_http()
+        self.navegador += 1
+        return 200, html
+
+    # Renderiza a página em um navegador do pool em até 'timeout' segundos (no máximo timeout_navegador).
+    # Ao estourar, a query segue sem esperar; a thread termina quando o carregamento da página estourar também.
+    async def renderizar(self, url, timeout=None):
+        timeout = self.timeout_navegador if timeout is None else min(timeout, self.timeout_navegador)
+        if timeout <= 0:
+            raise asyncio.TimeoutError()
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(loop.run_in_executor(self.executor, self._renderizar, url, timeout), timeout)
+
+    def _renderizar(self, url, timeout):
+        limite = time.monotonic() + timeout
+        with self.pool.acquire(timeout=timeout) as driver:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                raise TimeoutError(f"Sem tempo para renderizar {url}")
+            driver.set_page_load_timeout(restante)
+            driver.get(url)
+            esperar_pagina_carregada(driver, max(limite - time.monotonic(), 0))
+            return driver.page_source
+
+    # Não espera as renderizações em andamento (o pool fecha os navegadores)
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def estatisticas(self):
+        return {
+            'http': self.http,
+            'navegador': self.navegador,
+            'falhas_navegador': self.falhas_navegador,
+            'motivos': dict(self.motivos)
+        }
@@ -0,0 +1,78 @@
+import time
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+# Limites máximos de espera (segundos). As funções retornam assim que a
+# condição é satisfeita; estes valores só valem para o pior caso.
+TIMEOUT_CARREGAMENTO = 10   # document.readyState == 'complete'
+TIMEOUT_ELEMENTO = 5        # presença de um elemento na página
+TIMEOUT_REDE_OCIOSA = 3     # nenhuma requisição nova por JANELA_REDE_OCIOSA
+TIMEOUT_ROLAGEM = 2         # conteúdo novo depois de rolar a página
+JANELA_REDE_OCIOSA = 0.5
+INTERVALO_VERIFICACAO = 0.1
+
+
+# Função base: espera uma condição e retorna False em vez de levantar exceção no timeout
+def esperar(driver, condicao, timeout):
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=INTERVALO_VERIFICACAO).until(condicao)
+    except (TimeoutException, WebDriverException):
+        return False
+
+# Espera o documento terminar de carregar
+def esperar_documento_pronto(driver, timeout=TIMEOUT_CARREGAMENTO):
+    return esperar(driver, lambda d: d.execute_script("return document.readyState") == "complete", timeout)
+
+# Espera a presença de um elemento e o retorna (ou False)
+def esperar_elemento(driver, locator, timeout=TIMEOUT_ELEMENTO):
+    return esperar(driver, EC.presence_of_element_located(locator), timeout)
+
+# Espera qualquer um dos elementos aparecer e retorna o primeiro encontrado (ou False)
+def esperar_algum_elemento(driver, locators, timeout=TIMEOUT_ELEMENTO):
+    def algum_presente(d):
+        for locator in locators:
+            elementos = d.find_elements(*locator)
+            if elementos:
+                return elementos[0]
+        return False
+    return esperar(driver, algum_presente, timeout)
+
+# Espera um elemento da página anterior sair do DOM (navegação concluída)
+def esperar_troca_de_pagina(driver, elemento_antigo, timeout=TIMEOUT_CARREGAMENTO):
+    return esperar(driver, EC.staleness_of(elemento_antigo), timeout)
+
+# Espera a rede ficar ociosa: o número de recursos carregados para de crescer
+def esperar_rede_ociosa(driver, timeout=TIMEOUT_REDE_OCIOSA, janela=JANELA_REDE_OCIOSA):
+    limite = time.monotonic() + timeout
+    ultimo_total = -1
+    estavel_desde = time.monotonic()
+    while time.monotonic() < limite:
+        try:
+            total = driver.execute_script("return performance.getEntriesByType('resource').length")
+        except WebDriverException:
+            return False
+        agora = time.monotonic()
+        if total != ultimo_total:
+            ultimo_total = total
+            estavel_desde = agora
+        elif agora - estavel_desde >= janela:
+            return True
+        time.sleep(INTERVALO_VERIFICACAO)
+    return False
+
+# Espera a altura da página mudar depois de uma rolagem; retorna a altura atual
+def esperar_altura_mudar(driver, altura_anterior, timeout=TIMEOUT_ROLAGEM):
+    def altura_nova(d):
+        altura = d.execute_script("return document.body.scrollHeight")
+        return altura if altura != altura_anterior else False
+    return esperar(driver, altura_nova, timeout) or altura_anterior
+
+# Espera a página carregar por completo (documento pronto e rede ociosa)
+def esperar_pagina_carregada(driver, timeout=TIMEOUT_CARREGAMENTO):
+    inicio = time.monotonic()
+    if not esperar_documento_pronto(driver, timeout):
+        return False
+    restante = max(timeout - (time.monotonic() - inicio), 0)
+    return esperar_rede_ociosa(driver, min(TIMEOUT_REDE_OCIOSA, restante))
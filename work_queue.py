@@ -0,0 +1,210 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from canonical import canonicalizar_query
+
+# Tempo (em segundos) que uma query fica reservada para um worker; se ele não
+# confirmar nem renovar nesse tempo (ex.: o processo morreu), outro worker a pega
+DURACAO_LEASE = 300
+# Vezes que uma query pode ser reservada antes de ser marcada como falha
+MAX_TENTATIVAS = 3
+# Espera por outro processo que esteja escrevendo no banco
+TIMEOUT_BLOQUEIO = 60
+
+ESTADOS = ('pendente', 'em_andamento', 'concluida', 'falha')
+
+# Journal padrão (e não WAL), para que o banco possa ficar em um disco compartilhado entre máquinas
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS tarefas (
+    id INTEGER PRIMARY KEY,
+    chave TEXT NOT NULL UNIQUE,  -- forma canônica da query (ver canonical.py)
+    query TEXT NOT NULL,  -- primeira grafia enfileirada, a usada na busca
+    estado TEXT NOT NULL DEFAULT 'pendente',
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_ate REAL,  -- fim da reserva (em andamento) ou início da disponibilidade (pendente adiada)
+    resultado TEXT,
+    erro TEXT,
+    atualizado_em REAL
+);
+CREATE INDEX IF NOT EXISTS tarefas_estado ON tarefas (estado, lease_ate);
+-- Cada query da entrada aponta para a tarefa da sua forma canônica
+CREATE TABLE IF NOT EXISTS queries (
+    query TEXT PRIMARY KEY,
+    chave TEXT NOT NULL REFERENCES tarefas (chave)
+);
+"""
+
+
+# Identifica o worker entre processos e máquinas
+def identificar_worker():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+# Fila de queries durável em um SQLite local (ou em um disco compartilhado).
+# Os workers reservam queries por um tempo (lease), processam e confirmam;
+# quem usa a fila só depende de enfileirar/reservar/renovar/confirmar/falhar,
+# então ela pode ser trocada por outra implementação (ex.: um broker) com os mesmos métodos.
+class WorkQueue:
+    def __init__(self, caminho='fila.db', duracao_lease=DURACAO_LEASE, max_tentativas=MAX_TENTATIVAS):
+        self.caminho = caminho
+        self.duracao_lease = duracao_lease
+        self.max_tentativas = max_tentativas
+        # isolation_level=None: as transações são abertas explicitamente em _transacao.
+        # Os workers chamam a fila de threads (fora do event loop); o lock serializa o uso da conexão.
+        self._conexao = sqlite3.connect(caminho, timeout=TIMEOUT_BLOQUEIO, isolation_level=None, check_same_thread=False)
+        self._conexao.executescript(ESQUEMA)
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._conexao.close()
+
+    # BEGIN IMMEDIATE trava a escrita já no início, então dois workers nunca reservam a mesma query
+    @contextmanager
+    def _transacao(self):
+        with self._lock:
+            self._conexao.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._conexao
+            except BaseException:
+                self._conexao.execute('ROLLBACK')
+                raise
+            else:
+                self._conexao.execute('COMMIT')
+
+    # Acrescenta as queries (as que já estão na fila são ignoradas); retorna quantas entraram.
+    # Grafias equivalentes viram uma única tarefa, e o resultado vale para todas elas.
+    def enfileirar(self, queries, tamanho_lote=1000):
+        adicionadas = 0
+        lote = []
+        for query in queries:
+            query = query.strip()
+            if query:
+                lote.append((canonicalizar_query(query) or query, query, time.time()))
+            if len(lote) >= tamanho_lote:
+                adicionadas += self._inserir(lote)
+                lote = []
+        if lote:
+            adicionadas += self._inserir(lote)
+        return adicionadas
+
+    def _inserir(self, lote):
+        with self._transacao() as conexao:
+            conexao.executemany('INSERT OR IGNORE INTO tarefas (chave, query, atualizado_em) VALUES (?, ?, ?)', lote)
+            antes = conexao.total_changes
+            conexao.executemany('INSERT OR IGNORE INTO queries (chave, query) VALUES (?, ?)',
+                                [(chave, query) for chave, query, _ in lote])
+            return conexao.total_changes - antes
+
+    # Reserva até 'quantidade' queries pendentes ou com lease vencido; retorna [(id, query)]
+    def reservar(self, worker, quantidade=1, agora=None):
+        agora = agora if agora is not None else time.time()
+        with self._transacao() as conexao:
+            # Leases vencidos de queries que já esgotaram as tentativas viram falha
+            conexao.execute(
+                "UPDATE tarefas SET estado = 'falha', erro = COALESCE(erro, 'lease expirado'), worker = NULL, atualizado_em = ? "
+                "WHERE estado = 'em_andamento' AND lease_ate < ? AND tentativas >= ?",
+                (agora, agora, self.max_tentativas)
+            )
+            tarefas = conexao.execute(
+                "SELECT id, query FROM tarefas "
+                "WHERE (estado = 'pendente' AND (lease_ate IS NULL OR lease_ate <= ?)) OR (estado = 'em_andamento' AND lease_ate < ?) "
+                "ORDER BY id LIMIT ?",
+                (agora, agora, quantidade)
+            ).fetchall()
+            conexao.executemany(
+                "UPDATE tarefas SET estado = 'em_andamento', worker = ?, lease_ate = ?, tentativas = tentativas + 1, atualizado_em = ? "
+                "WHERE id = ?",
+                [(worker, agora + self.duracao_lease, agora, tarefa_id) for tarefa_id, _ in tarefas]
+            )
+        return tarefas
+
+    # Estende o lease das queries que ainda pertencem ao worker; retorna os ids renovados
+    def renovar(self, worker, ids, agora=None):
+        agora = agora if agora is not None else time.time()
+        renovados = []
+        with self._transacao() as conexao:
+            for tarefa_id in ids:
+                cursor = conexao.execute(
+                    "UPDATE tarefas SET lease_ate = ?, atualizado_em = ? WHERE id = ? AND worker = ? AND estado = 'em_andamento'",
+                    (agora + self.duracao_lease, agora, tarefa_id, worker)
+                )
+                if cursor.rowcount:
+                    renovados.append(tarefa_id)
+        return renovados
+
+    # Grava o resultado e conclui a query. Retorna False se o lease já tinha passado para
+    # outro worker (o resultado é descartado; quem tem o lease agora vai confirmar).
+    def confirmar(self, worker, tarefa_id, resultado):
+        with self._transacao() as conexao:
+            cursor = conexao.execute(
+                "UPDATE tarefas SET estado = 'concluida', resultado = ?, erro = NULL, worker = NULL, lease_ate = NULL, atualizado_em = ? "
+                "WHERE id = ? AND worker = ? AND estado = 'em_andamento'",
+                (json.dumps(resultado, ensure_ascii=False), time.time(), tarefa_id, worker)
+            )
+            return cursor.rowcount > 0
+
+    # Devolve a query para a fila (ou marca como falha, se esgotou as tentativas)
+    def falhar(self, worker, tarefa_id, erro):
+        with self._transacao() as conexao:
+            cursor = conexao.execute(
+                "UPDATE tarefas SET estado = CASE WHEN tentativas >= ? THEN 'falha' ELSE 'pendente' END, "
+                "erro = ?, worker = NULL, lease_ate = NULL, atualizado_em = ? "
+                "WHERE id = ? AND worker = ? AND estado = 'em_andamento'",
+                (self.max_tentativas, str(erro), time.time(), tarefa_id, worker)
+            )
+            return cursor.rowcount > 0
+
+    # Devolve a query para a fila só depois de 'espera' segundos, sem gastar uma tentativa
+    # (ex.: o host está limitando as requisições e a query não chegou a ser processada)
+    def adiar(self, worker, tarefa_id, espera, motivo=None):
+        agora = time.time()
+        with self._transacao() as conexao:
+            cursor = conexao.execute(
+                "UPDATE tarefas SET estado = 'pendente', tentativas = MAX(0, tentativas - 1), erro = ?, worker = NULL, "
+                "lease_ate = ?, atualizado_em = ? WHERE id = ? AND worker = ? AND estado = 'em_andamento'",
+                (motivo, agora + espera, agora, tarefa_id, worker)
+            )
+            return cursor.rowcount > 0
+
+    # Volta as falhas para a fila, com as tentativas zeradas
+    def reabrir_falhas(self):
+        with self._transacao() as conexao:
+            return conexao.execute(
+                "UPDATE tarefas SET estado = 'pendente', tentativas = 0, lease_ate = NULL, atualizado_em = ? WHERE estado = 'falha'",
+                (time.time(),)
+            ).rowcount
+
+    def contagens(self):
+        contagens = dict.fromkeys(ESTADOS, 0)
+        with self._lock:
+            linhas = self._conexao.execute('SELECT estado, COUNT(*) FROM tarefas GROUP BY estado').fetchall()
+        for estado, quantidade in linhas:
+            contagens[estado] = quantidade
+        return contagens
+
+    # Ainda há queries pendentes ou em andamento (de qualquer worker)
+    def em_aberto(self):
+        contagens = self.contagens()
+        return contagens['pendente'] + contagens['em_andamento'] > 0
+
+    # Resultados concluídos de cada query da entrada (inclusive as grafias equivalentes),
+    # sem carregar a tabela inteira: (query, resultado)
+    def resultados(self):
+        cursor = self._conexao.execute(
+            "SELECT queries.query, tarefas.resultado FROM queries JOIN tarefas ON tarefas.chave = queries.chave "
+            "WHERE tarefas.estado = 'concluida' ORDER BY queries.rowid"
+        )
+        for query, resultado in cursor:
+            yield query, json.loads(resultado)
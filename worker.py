@@ -0,0 +1,209 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from WebScrapSelenium import configure_driver, configure_render_driver, resolver_chromedriver
+from WebScrapBeautifulSoup import configurar_cache, configurar_controle_taxa, configurar_escalonamento, iterar_queries
+from app import PIPELINE_SELENIUM_COMPLETO, TAMANHO_POOL_ESCALONAMENTO, criar_processador_combinado
+from connection import ManagedSession
+from driver_pool import DriverPool, TAMANHO_POOL
+from metrics import categorizar, configurar_metricas
+from rate_control import BloqueioDetectado
+from sinks import JsonlSink
+from store import EnrichmentStore, site_do_resultado
+from work_queue import DURACAO_LEASE, MAX_TENTATIVAS, WorkQueue, identificar_worker
+
+# Queries reservadas de cada vez, à medida que a janela de queries em andamento abre espaço
+TAMANHO_RESERVA = 5
+# Espera quando não há nada para reservar, mas outros workers ainda têm queries em andamento
+# (se um deles morreu, as queries voltam para a fila quando o lease vencer)
+ESPERA_FILA_VAZIA = 5
+# Espera mínima para uma query bloqueada voltar a ser reservada
+ESPERA_MINIMA_BLOQUEIO = 10
+
+
+# Reserva queries aos poucos, conforme iterar_queries pede a próxima; termina quando não há o que reservar.
+# As chamadas à fila rodam em uma thread: com o banco em um disco compartilhado, a espera pelo lock
+# de escrita (até TIMEOUT_BLOQUEIO) não pode parar o event loop e as buscas em andamento.
+async def reservar_continuamente(fila, worker, ativas, tamanho_reserva=TAMANHO_RESERVA):
+    while True:
+        tarefas = await asyncio.to_thread(fila.reservar, worker, tamanho_reserva)
+        if not tarefas:
+            return
+        ativas.update(tarefas)
+        for tarefa in tarefas:
+            yield tarefa
+
+# Renova periodicamente o lease das queries reservadas por este worker.
+# As que não puderem ser renovadas já estão com outro worker e saem da lista.
+async def renovar_leases(fila, worker, ativas, intervalo):
+    while True:
+        await asyncio.sleep(intervalo)
+        if ativas:
+            renovadas = set(await asyncio.to_thread(fila.renovar, worker, list(ativas)))
+            for tarefa_id in list(ativas):
+                if tarefa_id not in renovadas:
+                    ativas.pop(tarefa_id, None)
+
+# Adapta o processamento combinado para a fila: recebe (id, query) e devolve (resultado, erro)
+# em vez de levantar, para que uma query com erro não interrompa as outras
+def criar_processador_fila(processar_combinado):
+    async def processar(tarefa, session, progress_bar=None):
+        _, query = tarefa
+        try:
+            return await processar_combinado(query, session, progress_bar), None
+        except Exception as e:
+            return None, e
+    return processar
+
+# Consome a fila até ela esvaziar: reserva, processa com os motores e confirma cada query.
+# Queries com erro voltam para a fila (até o máximo de tentativas); as bloqueadas pelo
+# host da busca voltam depois da pausa sugerida, sem gastar tentativa.
+async def executar_worker(fila, processar_combinado, session, worker=None, store=None, esperar_outros=True):
+    worker = worker or identificar_worker()
+    ativas = {}
+    contagem = Counter()
+    processar = criar_processador_fila(processar_combinado)
+    renovacao = asyncio.create_task(renovar_leases(fila, worker, ativas, fila.duracao_lease / 3))
+    try:
+        while True:
+            async for item in iterar_queries(reservar_continuamente(fila, worker, ativas), session, processar=processar):
+                tarefa_id, query = item['query']
+                ativas.pop(tarefa_id, None)
+                resultado, erro = item['result']
+                if isinstance(erro, BloqueioDetectado):
+                    await asyncio.to_thread(fila.adiar, worker, tarefa_id, max(erro.espera, ESPERA_MINIMA_BLOQUEIO),
+                                            f'bloqueio: {erro.motivo}')
+                    contagem['adiadas'] += 1
+                elif erro is not None:
+                    await asyncio.to_thread(fila.falhar, worker, tarefa_id, f'{categorizar(erro)}: {erro}')
+                    contagem['falhas'] += 1
+                elif await asyncio.to_thread(fila.confirmar, worker, tarefa_id, resultado.to_dict()):
+                    contagem['concluidas'] += 1
+                    if store is not None:
+                        store.registrar(query, site_do_resultado(resultado), resultado)
+                else:
+                    contagem['lease_perdido'] += 1
+
+            if not esperar_outros or not await asyncio.to_thread(fila.em_aberto):
+                break
+            await asyncio.sleep(ESPERA_FILA_VAZIA)
+    finally:
+        renovacao.cancel()
+    return contagem
+
+# Um processo worker: abre a sessão HTTP (e os navegadores, se habilitados) uma vez e consome a fila
+async def rodar_worker(caminho_fila, usar_selenium=PIPELINE_SELENIUM_COMPLETO, workers_selenium=TAMANHO_POOL,
+                       caminho_store=None, duracao_lease=DURACAO_LEASE, max_tentativas=MAX_TENTATIVAS):
+    worker = identificar_worker()
+    configurar_metricas()
+    controle_taxa = configurar_controle_taxa()
+    with ExitStack() as pilha:
+        fila = pilha.enter_context(WorkQueue(caminho_fila, duracao_lease, max_tentativas))
+        store = pilha.enter_context(EnrichmentStore(caminho_store)) if caminho_store else None
+
+        # Páginas que dependem de JavaScript vão para um navegador, como no app
+        escalonamento = pilha.enter_context(DriverPool(configure_render_driver, tamanho=TAMANHO_POOL_ESCALONAMENTO))
+        configurar_escalonamento(escalonamento)
+        pilha.callback(configurar_escalonamento, None)
+
+        pool, executor = None, None
+        if usar_selenium:
+            resolver_chromedriver()
+            pool = pilha.enter_context(DriverPool(configure_driver, tamanho=workers_selenium))
+            executor = pilha.enter_context(ThreadPoolExecutor(max_workers=workers_selenium, thread_name_prefix='selenium'))
+        processar = criar_processador_combinado(usar_selenium, True, pool, executor, workers_selenium, exigir_resultado=True)
+
+        async with ManagedSession() as session:
+            contagem = await executar_worker(fila, processar, session, worker, store)
+    print(f"Worker {worker}: {dict(contagem)} {controle_taxa.estatisticas()}")
+    return contagem
+
+def processo_worker(caminho_fila, usar_selenium, workers_selenium, caminho_store, duracao_lease, max_tentativas, modo_cache):
+    configurar_cache(modo=modo_cache)
+    asyncio.run(rodar_worker(caminho_fila, usar_selenium, workers_selenium, caminho_store, duracao_lease, max_tentativas))
+
+# Sobe N processos worker nesta máquina. Em várias máquinas, rode o mesmo comando
+# em cada uma apontando para a mesma fila em um disco compartilhado.
+def trabalhar(caminho_fila, processos=1, usar_selenium=PIPELINE_SELENIUM_COMPLETO, workers_selenium=TAMANHO_POOL,
+              caminho_store=None, duracao_lease=DURACAO_LEASE, max_tentativas=MAX_TENTATIVAS, modo_cache='normal'):
+    argumentos = (caminho_fila, usar_selenium, workers_selenium, caminho_store, duracao_lease, max_tentativas, modo_cache)
+    if processos <= 1:
+        processo_worker(*argumentos)
+        return
+    contexto = multiprocessing.get_context('spawn')
+    filhos = [contexto.Process(target=processo_worker, args=argumentos, name=f'worker-{numero}') for numero in range(processos)]
+    for filho in filhos:
+        filho.start()
+    for filho in filhos:
+        filho.join()
+
+def ler_queries(caminho):
+    arquivo = sys.stdin if caminho == '-' else open(caminho, encoding='utf-8')
+    with arquivo:
+        for linha in arquivo:
+            if linha.strip():
+                yield linha.strip()
+
+def main():
+    parser = argparse.ArgumentParser(description="Fila de queries com workers em vários processos ou máquinas")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+
+    enfileirar = subcomandos.add_parser('enfileirar', help="Acrescenta queries (uma por linha) à fila")
+    enfileirar.add_argument('fila', help="Arquivo SQLite da fila")
+    enfileirar.add_argument('queries', help="Arquivo com uma query por linha ('-' para a entrada padrão)")
+    enfileirar.add_argument('--store', help="Só enfileira as queries novas, desatualizadas ou incompletas neste store")
+
+    trabalho = subcomandos.add_parser('trabalhar', help="Consome a fila até ela esvaziar")
+    trabalho.add_argument('fila', help="Arquivo SQLite da fila")
+    trabalho.add_argument('--processos', type=int, default=1, help="Processos worker nesta máquina")
+    trabalho.add_argument('--selenium', action='store_true', default=PIPELINE_SELENIUM_COMPLETO,
+                          help="Roda também o pipeline completo do Selenium em cada query")
+    trabalho.add_argument('--navegadores', type=int, default=TAMANHO_POOL, help="Navegadores por processo com --selenium")
+    trabalho.add_argument('--store', help="Grava os resultados também neste store")
+    trabalho.add_argument('--lease', type=float, default=DURACAO_LEASE, help="Segundos de reserva de cada query")
+    trabalho.add_argument('--max-tentativas', type=int, default=MAX_TENTATIVAS, help="Tentativas por query antes de falhar")
+    trabalho.add_argument('--cache', choices=['normal', 'refresh', 'replay', 'off'], default='normal', help="Modo do cache de respostas")
+
+    status = subcomandos.add_parser('status', help="Mostra quantas queries há em cada estado")
+    status.add_argument('fila', help="Arquivo SQLite da fila")
+
+    exportar = subcomandos.add_parser('exportar', help="Grava os resultados concluídos em JSONL")
+    exportar.add_argument('fila', help="Arquivo SQLite da fila")
+    exportar.add_argument('saida', help="Arquivo JSONL de saída")
+
+    reabrir = subcomandos.add_parser('reabrir', help="Volta as queries que falharam para a fila")
+    reabrir.add_argument('fila', help="Arquivo SQLite da fila")
+
+    args = parser.parse_args()
+
+    if args.comando == 'trabalhar':
+        trabalhar(args.fila, args.processos, args.selenium, args.navegadores, args.store, args.lease, args.max_tentativas, args.cache)
+        return
+
+    with WorkQueue(args.fila) as fila:
+        if args.comando == 'enfileirar':
+            # Grafias equivalentes da mesma query viram uma única busca
+            queries = ler_queries(args.queries)
+            if args.store:
+                with EnrichmentStore(args.store) as store:
+                    adicionadas = fila.enfileirar(query for query in queries if store.precisa_atualizar(query))
+            else:
+                adicionadas = fila.enfileirar(queries)
+            print(f"{adicionadas} queries adicionadas")
+        elif args.comando == 'exportar':
+            with JsonlSink(args.saida, modo='w') as sink:
+                for query, resultado in fila.resultados():
+                    sink.escrever({'query': query, 'result': resultado})
+            print(f"{sink.escritos} resultados exportados")
+        elif args.comando == 'reabrir':
+            print(f"{fila.reabrir_falhas()} queries voltaram para a fila")
+        print(json.dumps(fila.contagens(), indent=4, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()